@@ -12,6 +12,7 @@ from furl import furl
 from requests.auth import HTTPBasicAuth
 from snowflake.connector.errors import DatabaseError
 from steps.expected_structures import EXPECTED_STRUCTURES
+from case18 import validate_incrementally, reset_partition_metrics
 
 
 def _prepare_env(envdir):
@@ -48,6 +49,7 @@ def before_all(context):
     _load_environment_variables()
 
     context.call_airflow = _create_base_airflow_request
+    context.validate_traffic_data = validate_incrementally
     context.databases = {
         "TRAFFIC_DB": os.getenv("SNOWFLAKE-TRAFFIC-DATABASE"),
         "REFERENCE_DB": os.getenv("SNOWFLAKE-REFERENCE-DATABASE"),
@@ -68,6 +70,7 @@ def before_scenario(context, scenario):
 def before_tag(context, tag):
     if "endtoend" == tag:
         _truncate_tables(context.snowflake_connection)
+        reset_partition_metrics(context.snowflake_connection)
 
 
 def after_scenario(context, scenario):
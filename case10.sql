@@ -0,0 +1,54 @@
+{{
+    config(
+        materialized='incremental',
+        unique_key=['route_key', 'leg_number'],
+        tags=['adjusted', 'route']
+    )
+}}
+
+with routes as (
+
+    select *
+    from {{ ref('route_dimension') }}
+    {% if is_incremental() %}
+    where route_key > (select coalesce(max(route_key), 0) from {{ this }})
+    {% endif %}
+
+)
+
+    select
+        route_key
+      , 1 as leg_number
+      , scheduled_departure_airport_iata as leg_departure_airport_iata
+      , coalesce(connecting_airport_1, scheduled_arrival_airport_iata) as leg_arrival_airport_iata
+      , stopping_airport_1_leg_1 as stopping_airport_1
+      , stopping_airport_2_leg_1 as stopping_airport_2
+      , stopping_airport_3_leg_1 as stopping_airport_3
+    from routes
+    where legs_total >= 1
+
+    union all
+
+    select
+        route_key
+      , 2 as leg_number
+      , connecting_airport_1_a as leg_departure_airport_iata
+      , coalesce(connecting_airport_2, scheduled_arrival_airport_iata) as leg_arrival_airport_iata
+      , stopping_airport_1_leg_2 as stopping_airport_1
+      , stopping_airport_2_leg_2 as stopping_airport_2
+      , stopping_airport_3_leg_2 as stopping_airport_3
+    from routes
+    where legs_total >= 2
+
+    union all
+
+    select
+        route_key
+      , 3 as leg_number
+      , connecting_airport_2_a as leg_departure_airport_iata
+      , scheduled_arrival_airport_iata as leg_arrival_airport_iata
+      , stopping_airport_1_leg_3 as stopping_airport_1
+      , stopping_airport_2_leg_3 as stopping_airport_2
+      , stopping_airport_3_leg_3 as stopping_airport_3
+    from routes
+    where legs_total >= 3
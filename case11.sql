@@ -0,0 +1,125 @@
+{{ config(tags=['unit-test']) }}
+
+{% call dbt_unit_testing.test('route_dimension', 'STP1, STP2, STP3 are split correctly') %}
+
+  {% call dbt_unit_testing.mock_ref ('adjusted_final') %}
+      org   | dst   | cnx1  | cnx2  | cnx1a | cnx2a | stp1        | stp2        | stp3        | load_timestamp
+      'AYT' | 'EZS' | 'JJJ' | 'KKK' | 'YYY' | 'ZZZ' | 'LLLMMM'    | 'OOOPPP'    | 'RRRSSS'    | '2017-01-01 12:00:00'
+  {% endcall %}
+
+  {% call dbt_unit_testing.mock_ref ('adjusted_preliminary') %}
+      org   | dst   | cnx1  | cnx2  | cnx1a | cnx2a | stp1        | stp2        | stp3        | load_timestamp
+      'AYT' | 'EZS' | 'JJJ' | 'KKK' | 'YYY' | 'ZZZ' | 'LLLMMM'    | 'OOOPPP'    | 'RRRSSS'    | '2017-01-02 12:00:00'
+  {% endcall %}
+
+  {% call dbt_unit_testing.expect() %}
+      route_key | scheduled_departure_airport_iata | scheduled_arrival_airport_iata | stopping_airport_1_leg_1 | stopping_airport_2_leg_1 | stopping_airport_3_leg_1 | stopping_airport_1_leg_2 | stopping_airport_2_leg_2 | stopping_airport_3_leg_2 | stopping_airport_1_leg_3 | stopping_airport_2_leg_3 | stopping_airport_3_leg_3 | legs_total | source_load_timestamp
+      1         | 'AYT'                            | 'EZS'                          | 'LLL'                    | 'MMM'                    | null                     | 'OOO'                    | 'PPP'                    | null                     | 'RRR'                    | 'SSS'                    | null                     | 3          | '2017-01-02 12:00:00'
+  {% endcall %}
+
+{% endcall %}
+
+UNION ALL
+
+{% call dbt_unit_testing.test('route_dimension', 'legs_total is calculated correctly') %}
+
+  {% call dbt_unit_testing.mock_ref ('adjusted_final') %}
+      org   | dst   | cnx1  | cnx2  | cnx1a | cnx2a | stp1        | stp2        | stp3        | load_timestamp
+      'AYT' | 'EZS' | null  | null  | null  | null  | 'LLLMMMNNN' | null        | null        | '2017-01-01 12:00:00'
+      'AYT' | 'EZS' | 'JJJ' | null  | 'YYY' | null  | 'LLLMMMNNN' | 'OOOPPPQQQ' | null        | '2017-01-01 12:00:00'
+      'AYT' | 'EZS' | 'JJJ' | 'KKK' | 'YYY' | 'ZZZ' | 'LLLMMMNNN' | 'OOOPPPQQQ' | 'RRRSSSTTT' | '2017-01-01 12:00:00'
+      'AYT' | 'EZS' | 'JJJ' | 'KKK' | 'YYY' | null  | 'LLLMMMNNN' | 'OOOPPPQQQ' | 'RRRSSSTTT' | '2017-01-01 12:00:00'
+      'AYT' | 'EZS' | null  | 'KKK' | 'YYY' | 'ZZZ' | 'LLLMMMNNN' | 'OOOPPPQQQ' | 'RRRSSSTTT' | '2017-01-01 12:00:00'
+  {% endcall %}
+
+  {% call dbt_unit_testing.mock_ref ('adjusted_preliminary') %}
+      org   | dst   | cnx1  | cnx2  | cnx1a | cnx2a | stp1        | stp2        | stp3        | load_timestamp
+      'AYT' | 'EZS' | null  | null  | null  | null  | 'LLLMMMNNN' | null        | null        | '2017-01-01 12:00:00'
+  {% endcall %}
+
+  {% call dbt_unit_testing.expect() %}
+      connecting_airport_1 | connecting_airport_2 | connecting_airport_1_a | connecting_airport_2_a | legs_total
+      null                 | null                 | null                   | null                   | 1
+      'JJJ'                | null                 | 'YYY'                  | null                   | 2
+      'JJJ'                | 'KKK'                | 'YYY'                  | 'ZZZ'                  | 3
+      'JJJ'                | 'KKK'                | 'YYY'                  | null                   | null
+      null                 | 'KKK'                | 'YYY'                  | 'ZZZ'                  | null
+  {% endcall %}
+
+{% endcall %}
+
+UNION ALL
+
+{% call dbt_unit_testing.test('route_dimension', 'known itineraries keep their route_key and move the watermark, unseen ones get a new route_key. Incremental test', options={"run_as_incremental": "True"}) %}
+
+  {% call dbt_unit_testing.mock_ref ('adjusted_final') %}
+      org   | dst   | cnx1  | cnx2  | cnx1a | cnx2a | stp1        | stp2        | stp3        | load_timestamp
+      'AYT' | 'EZS' | 'JJJ' | 'KKK' | 'YYY' | 'ZZZ' | 'LLLMMMNNN' | 'OOOPPPQQQ' | 'RRRSSSTTT' | '2017-01-01 12:00:00'
+      'AYT' | 'EZS' | 'JJJ' | 'KKK' | 'YYY' | 'ZZZ' | 'LLLMMMNNN' | 'OOOPPPQQQ' | 'RRRSSSTTT' | '2017-02-01 12:00:00'
+      'AYT' | 'IST' | null  | null  | null  | null  | null        | null        | null        | '2017-02-01 12:00:00'
+  {% endcall %}
+
+  {% call dbt_unit_testing.mock_ref ('adjusted_preliminary') %}
+      org   | dst   | cnx1  | cnx2  | cnx1a | cnx2a | stp1        | stp2        | stp3        | load_timestamp
+      'AYT' | 'ESB' | null  | null  | null  | null  | null        | null        | null        | '2016-12-01 12:00:00'
+  {% endcall %}
+
+  {% call dbt_unit_testing.mock_ref ('route_dimension') %}
+      route_key | route_hash                         | scheduled_departure_airport_iata | scheduled_arrival_airport_iata | legs_total | source_load_timestamp
+      7         | 'c150b2441c76b1b8040fb5b645d3489c' | 'AYT'                            | 'EZS'                          | 3          | '2017-01-01 12:00:00'
+  {% endcall %}
+
+  {% call dbt_unit_testing.expect() %}
+      route_key | scheduled_departure_airport_iata | scheduled_arrival_airport_iata | legs_total | source_load_timestamp
+      7         | 'AYT'                            | 'EZS'                          | 3          | '2017-02-01 12:00:00'
+      8         | 'AYT'                            | 'IST'                          | 1          | '2017-02-01 12:00:00'
+  {% endcall %}
+
+{% endcall %}
+
+UNION ALL
+
+{% call dbt_unit_testing.test('route_legs', 'routes are split into legs between the connecting airports') %}
+
+  {% call dbt_unit_testing.mock_ref ('route_dimension') %}
+      route_key | scheduled_departure_airport_iata | scheduled_arrival_airport_iata | connecting_airport_1 | connecting_airport_2 | connecting_airport_1_a | connecting_airport_2_a | stopping_airport_1_leg_1 | stopping_airport_1_leg_2 | stopping_airport_1_leg_3 | legs_total
+      1         | 'AYT'                            | 'EZS'                          | null                 | null                 | null                   | null                   | 'LLL'                    | null                     | null                     | 1
+      2         | 'AYT'                            | 'EZS'                          | 'JJJ'                | null                 | 'YYY'                  | null                   | 'LLL'                    | 'OOO'                    | null                     | 2
+      3         | 'AYT'                            | 'EZS'                          | 'JJJ'                | 'KKK'                | 'YYY'                  | 'ZZZ'                  | 'LLL'                    | 'OOO'                    | 'RRR'                    | 3
+      4         | 'AYT'                            | 'EZS'                          | 'JJJ'                | 'KKK'                | 'YYY'                  | null                   | null                     | null                     | null                     | null
+  {% endcall %}
+
+  {% call dbt_unit_testing.expect() %}
+      route_key | leg_number | leg_departure_airport_iata | leg_arrival_airport_iata | stopping_airport_1
+      1         | 1          | 'AYT'                      | 'EZS'                    | 'LLL'
+      2         | 1          | 'AYT'                      | 'JJJ'                    | 'LLL'
+      2         | 2          | 'YYY'                      | 'EZS'                    | 'OOO'
+      3         | 1          | 'AYT'                      | 'JJJ'                    | 'LLL'
+      3         | 2          | 'YYY'                      | 'KKK'                    | 'OOO'
+      3         | 3          | 'ZZZ'                      | 'EZS'                    | 'RRR'
+  {% endcall %}
+
+{% endcall %}
+
+UNION ALL
+
+{% call dbt_unit_testing.test('route_legs', 'only routes with a new route_key are split. Incremental test', options={"run_as_incremental": "True"}) %}
+
+  {% call dbt_unit_testing.mock_ref ('route_dimension') %}
+      route_key | scheduled_departure_airport_iata | scheduled_arrival_airport_iata | connecting_airport_1 | connecting_airport_2 | connecting_airport_1_a | connecting_airport_2_a | legs_total
+      1         | 'AYT'                            | 'EZS'                          | null                 | null                 | null                   | null                   | 1
+      2         | 'AYT'                            | 'IST'                          | 'JJJ'                | null                 | 'YYY'                  | null                   | 2
+  {% endcall %}
+
+  {% call dbt_unit_testing.mock_ref ('route_legs') %}
+      route_key | leg_number | leg_departure_airport_iata | leg_arrival_airport_iata
+      1         | 1          | 'AYT'                      | 'EZS'
+  {% endcall %}
+
+  {% call dbt_unit_testing.expect() %}
+      route_key | leg_number | leg_departure_airport_iata | leg_arrival_airport_iata
+      2         | 1          | 'AYT'                      | 'JJJ'
+      2         | 2          | 'YYY'                      | 'IST'
+  {% endcall %}
+
+{% endcall %}
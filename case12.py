@@ -0,0 +1,353 @@
+import argparse
+import gzip
+import json
+import math
+import os
+import random
+import resource
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import paramiko
+import pysftp
+
+from pathlib import Path
+from typing import Callable, Union
+from case8 import SftpReader, BlobUploader, list_files_to_copy, copy_file
+
+TRAFFIC_FILE_TEMPLATES = [
+    "{prefix}_ILLUM_CONCAT_VIABK_FINAL_SURFACE.txt.gz",
+    "{prefix}_ILLUM_CONCAT_VIABK_PRELIM_SURFACE.txt.gz",
+    "{prefix}_UNADJ_ITIN_CUR.txt.gz",
+    "{prefix}_UNADJ_ITIN_ADV.txt.gz",
+]
+AIRPORTS = ["AYT", "EZS", "IST", "ESB", "FRA", "MUC", "LHR", "CDG", "AMS", "JFK", "DXB", "DOH"]
+CARRIERS = ["TK", "PC", "LH", "BA", "AF", "KL", "AA", "EK", "QR", "XQ"]
+COUNTRIES = ["TR", "DE", "GB", "FR", "NL", "US", "AE", "QA"]
+BOOKING_CLASSES = 27
+SFTP_USERNAME = "benchmark"
+SFTP_PASSWORD = "benchmark"
+COPY_CHUNK_SIZE = 4 * 1024 * 1024
+ROWS_PER_WRITE = 100
+PERCENTILES = [50, 90, 99]
+
+
+def _traffic_row(rng: random.Random, travel_month: str) -> str:
+    org, cnx1, cnx2, dst = rng.sample(AIRPORTS, 4)
+    legs_total = rng.randint(1, 3)
+    connections = [cnx1 if legs_total > 1 else "", cnx2 if legs_total > 2 else ""]
+    stops = ["".join(rng.sample(AIRPORTS, rng.randint(0, 3))) for _ in range(3)]
+    carriers = [rng.choice(CARRIERS) for _ in range(9)]
+    passengers = [rng.randint(0, 50) for _ in range(BOOKING_CLASSES)]
+    fields = [
+        travel_month,
+        rng.choice(COUNTRIES),
+        org,
+        org,
+        dst,
+        *carriers,
+        *connections,
+        *stops,
+        *map(str, passengers),
+        str(sum(passengers)),
+        *connections,
+    ]
+    return "|".join(fields) + "\n"
+
+
+def generate_traffic_file(path: Path, size_bytes: int, seed: int = 0) -> int:
+    # size_bytes is the compressed size on disk, which is what the SFTP read and blob upload move
+    rng = random.Random(seed)
+    travel_month = path.name[:6]
+    with open(path, "wb") as raw, gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=6) as f:
+        while raw.tell() < size_bytes:
+            f.write("".join(_traffic_row(rng, travel_month) for _ in range(ROWS_PER_WRITE)).encode())
+    return path.stat().st_size
+
+
+def generate_traffic_files(directory: Path, file_count: int, size_bytes: int) -> list[Path]:
+    directory.mkdir(exist_ok=True, parents=True)
+    files = []
+    for index in range(file_count):
+        template = TRAFFIC_FILE_TEMPLATES[index % len(TRAFFIC_FILE_TEMPLATES)]
+        path = directory / template.format(prefix=f"{200001 + index // len(TRAFFIC_FILE_TEMPLATES):06d}")
+        generate_traffic_file(path, size_bytes, seed=index)
+        files.append(path)
+    return files
+
+
+class _LocalSftpHandle(paramiko.SFTPHandle):
+    def stat(self):
+        return paramiko.SFTPAttributes.from_stat(os.fstat(self.readfile.fileno()))
+
+
+class _LocalSftpServer(paramiko.SFTPServerInterface):
+    def __init__(self, server, *args, root: Path, **kwargs):
+        super().__init__(server, *args, **kwargs)
+        self.root = root
+
+    def _local_path(self, path: str) -> Path:
+        return self.root / path.lstrip("/").removeprefix("./")
+
+    def canonicalize(self, path):
+        return "/" + os.path.normpath(path).lstrip("/.")
+
+    def list_folder(self, path):
+        folder = self._local_path(path)
+        return [paramiko.SFTPAttributes.from_stat(entry.stat(), entry.name) for entry in folder.iterdir()]
+
+    def stat(self, path):
+        try:
+            return paramiko.SFTPAttributes.from_stat(self._local_path(path).stat())
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+
+    lstat = stat
+
+    def open(self, path, flags, attr):
+        try:
+            readfile = open(self._local_path(path), "rb")
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+        handle = _LocalSftpHandle(flags)
+        handle.filename = str(self._local_path(path))
+        handle.readfile = readfile
+        return handle
+
+
+class _PasswordServer(paramiko.ServerInterface):
+    def get_allowed_auths(self, username):
+        return "password"
+
+    def check_auth_password(self, username, password):
+        if (username, password) == (SFTP_USERNAME, SFTP_PASSWORD):
+            return paramiko.AUTH_SUCCESSFUL
+        return paramiko.AUTH_FAILED
+
+    def check_channel_request(self, kind, chanid):
+        if kind == "session":
+            return paramiko.OPEN_SUCCEEDED
+        return paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+
+class InProcessSftpServer:
+    def __init__(self, root: Path):
+        self.root = root
+        self.host_key = paramiko.RSAKey.generate(2048)
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._socket.bind(("127.0.0.1", 0))
+        self._transports = []
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+
+    @property
+    def port(self) -> int:
+        return self._socket.getsockname()[1]
+
+    def _serve(self):
+        while True:
+            try:
+                client, _ = self._socket.accept()
+            except OSError:
+                return
+            transport = paramiko.Transport(client)
+            transport.add_server_key(self.host_key)
+            transport.set_subsystem_handler("sftp", paramiko.SFTPServer, _LocalSftpServer, root=self.root)
+            transport.start_server(server=_PasswordServer())
+            self._transports.append(transport)
+
+    def connect(self) -> pysftp.Connection:
+        cnopts = pysftp.CnOpts()
+        cnopts.hostkeys = None
+        return pysftp.Connection(
+            host="127.0.0.1", port=self.port, username=SFTP_USERNAME, password=SFTP_PASSWORD, cnopts=cnopts
+        )
+
+    def __enter__(self):
+        self._socket.listen()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._socket.close()
+        for transport in self._transports:
+            transport.close()
+
+
+class LocalContainerClient:
+    def __init__(self, root: Path):
+        self.root = root
+        self.root.mkdir(exist_ok=True, parents=True)
+
+    def upload_blob(self, name, data, overwrite=False):
+        target = self.root / name
+        if target.exists() and not overwrite:
+            raise FileExistsError(f"Blob {name} already exists")
+        with open(target, "wb") as f:
+            if isinstance(data, (bytes, bytearray)):
+                f.write(data)
+            else:
+                shutil.copyfileobj(data, f, COPY_CHUNK_SIZE)
+
+
+def _process_high_water_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _start_memory_window() -> int:
+    tracemalloc.reset_peak()
+    return tracemalloc.get_traced_memory()[0]
+
+
+def _traced_peak_since(traced_at_start: int) -> int:
+    return tracemalloc.get_traced_memory()[1] - traced_at_start
+
+
+def _percentile(values: list[float], percentile: int) -> float:
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, math.ceil(percentile / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def _stage_result(
+    file_count: int, latencies: list[float], total_seconds: float, total_bytes: int, peak_traced_bytes: int
+) -> dict:
+    return {
+        "files": file_count,
+        "seconds": total_seconds,
+        "files_per_second": file_count / total_seconds if total_seconds else 0.0,
+        "mb_per_second": total_bytes / 1024 / 1024 / total_seconds if total_seconds else 0.0,
+        "peak_traced_mb": peak_traced_bytes / 1024 / 1024,
+        "process_high_water_rss_mb": _process_high_water_rss_mb(),
+        "latency_ms": {f"p{p}": _percentile(latencies, p) * 1000 for p in PERCENTILES} if latencies else {},
+    }
+
+
+def _time_per_file(filenames: list[str], sizes: dict, step: Callable[[str], None]) -> dict:
+    latencies = []
+    traced_at_start = _start_memory_window()
+    started = time.perf_counter()
+    for filename in filenames:
+        file_started = time.perf_counter()
+        step(filename)
+        latencies.append(time.perf_counter() - file_started)
+    total_seconds = time.perf_counter() - started
+    return _stage_result(
+        len(filenames),
+        latencies,
+        total_seconds,
+        sum(sizes[filename] for filename in filenames),
+        _traced_peak_since(traced_at_start),
+    )
+
+
+def _read_sftp_file(sftp: SftpReader, filename: str):
+    with sftp.read_sftp_file(filename) as data:
+        data.read()
+
+
+def _upload_local_file(blob: BlobUploader, path: Path):
+    with open(path, "rb") as data:
+        blob.upload_file_to_blob(path.name, data)
+
+
+def run_benchmark(file_count: int, size_mb: float, workdir: Path) -> dict:
+    source = workdir / "sftp"
+    files = generate_traffic_files(source, file_count, int(size_mb * 1024 * 1024))
+    sizes = {path.name: path.stat().st_size for path in files}
+    stages = {}
+
+    # Peak memory per stage comes from tracemalloc, ru_maxrss is only the process high-water mark
+    tracing = tracemalloc.is_tracing()
+    if not tracing:
+        tracemalloc.start()
+    try:
+        with InProcessSftpServer(source) as server:
+            sftp = SftpReader(sftp_connection=server.connect())
+            blob = BlobUploader(container_client=LocalContainerClient(workdir / "blob"))
+
+            traced_at_start = _start_memory_window()
+            started = time.perf_counter()
+            filenames = list_files_to_copy(sftp)
+            list_seconds = time.perf_counter() - started
+            stages["list"] = _stage_result(
+                len(filenames), [list_seconds], list_seconds, 0, _traced_peak_since(traced_at_start)
+            )
+
+            stages["sftp_read"] = _time_per_file(filenames, sizes, lambda filename: _read_sftp_file(sftp, filename))
+            stages["blob_upload"] = _time_per_file(
+                filenames, sizes, lambda filename: _upload_local_file(blob, source / filename)
+            )
+            stages["copy"] = _time_per_file(filenames, sizes, lambda filename: copy_file(sftp, blob, filename))
+            sftp.sftp_connection.close()
+    finally:
+        if not tracing:
+            tracemalloc.stop()
+
+    return {
+        "created": time.time(),
+        "python": sys.version.split()[0],
+        "parameters": {"file_count": file_count, "size_mb": size_mb},
+        "total_mb": sum(sizes.values()) / 1024 / 1024,
+        "stages": stages,
+    }
+
+
+def compare_results(baseline: dict, current: dict, tolerance: float) -> list[str]:
+    regressions = []
+    for stage, baseline_stage in baseline["stages"].items():
+        current_stage = current["stages"].get(stage)
+        if current_stage is None:
+            regressions.append(f"{stage}: missing from the current run")
+            continue
+        for metric in ["files_per_second", "mb_per_second"]:
+            if current_stage[metric] < baseline_stage[metric] * (1 - tolerance):
+                regressions.append(
+                    f"{stage}.{metric}: {current_stage[metric]:.2f} < baseline {baseline_stage[metric]:.2f}"
+                )
+        for percentile, baseline_latency in baseline_stage["latency_ms"].items():
+            current_latency = current_stage["latency_ms"].get(percentile, 0.0)
+            if current_latency > baseline_latency * (1 + tolerance):
+                regressions.append(
+                    f"{stage}.latency_ms.{percentile}: {current_latency:.2f} > baseline {baseline_latency:.2f}"
+                )
+        current_peak, baseline_peak = current_stage.get("peak_traced_mb"), baseline_stage.get("peak_traced_mb")
+        if current_peak is not None and baseline_peak is not None and current_peak > baseline_peak * (1 + tolerance):
+            regressions.append(f"{stage}.peak_traced_mb: {current_peak:.1f} > baseline {baseline_peak:.1f}")
+    return regressions
+
+
+def _read_results(path: Union[Path, str]) -> dict:
+    with open(path) as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Throughput benchmark for the SFTP to Blob traffic ingest")
+    parser.add_argument("--files", type=int, default=8)
+    parser.add_argument("--size-mb", type=float, default=1.0, help="Compressed size of each generated file")
+    parser.add_argument("--output", type=Path, default=Path("bench_results.json"))
+    parser.add_argument("--baseline", type=Path)
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        results = run_benchmark(args.files, args.size_mb, Path(workdir))
+
+    args.output.write_text(json.dumps(results, indent=2))
+    print(json.dumps(results["stages"], indent=2))
+
+    if args.baseline:
+        regressions = compare_results(_read_results(args.baseline), results, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()  # pragma: no cover
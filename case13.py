@@ -0,0 +1,243 @@
+import json
+import logging
+import os
+import random
+import resource
+import threading
+import time
+import tracemalloc
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache, wraps
+from pathlib import Path
+from typing import Callable, NamedTuple, Optional, Union
+from uuid import uuid4
+
+LATENCY_BUCKETS_MS = [50, 100, 250, 500, 1000, 2500, 5000, 10000]
+
+_current_span: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+_memory_traces = 0
+_memory_traces_lock = threading.Lock()
+
+
+class Settings(NamedTuple):
+    sample_rate: float
+    trace_memory: bool
+
+
+@lru_cache(maxsize=None)
+def get_settings() -> Settings:
+    # TelemetryTraceMemory=1 runs tracemalloc while a sampled message is traced, so spans carry peak_traced_mb.
+    # tracemalloc slows allocations down noticeably, lower TelemetrySampleRate when switching it on.
+    return Settings(
+        sample_rate=float(os.getenv("TelemetrySampleRate", "1.0")),
+        trace_memory=os.getenv("TelemetryTraceMemory", "0") == "1",
+    )
+
+
+class LatencyHistogram:
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, milliseconds: float):
+        index = 0
+        while index < len(LATENCY_BUCKETS_MS) and milliseconds > LATENCY_BUCKETS_MS[index]:
+            index += 1
+        self.counts[index] += 1
+        self.count += 1
+        self.total_ms += milliseconds
+        self.max_ms = max(self.max_ms, milliseconds)
+
+    def to_dict(self) -> dict:
+        buckets = [f"le_{bound}" for bound in LATENCY_BUCKETS_MS] + ["le_inf"]
+        return {
+            "count": self.count,
+            "total_ms": self.total_ms,
+            "max_ms": self.max_ms,
+            "buckets": dict(zip(buckets, self.counts)),
+        }
+
+
+class Span:
+    def __init__(self, name: str, trace_id: str, parent: Optional["Span"] = None, sampled: bool = True):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent else None
+        self.sampled = sampled
+        self.attributes = {}
+        self.http_calls = {}
+        self._parent = parent
+        self._traced_at_start = None
+        self._carried_peak = 0
+        if sampled and tracemalloc.is_tracing():
+            # The tracemalloc peak is process wide: hand the peak seen so far to the parent before resetting it
+            # for this span, and hand this span's peak back to the parent in finish()
+            current, peak = tracemalloc.get_traced_memory()
+            if parent is not None:
+                parent._carried_peak = max(parent._carried_peak, peak)
+            tracemalloc.reset_peak()
+            self._traced_at_start = current
+        self._wall_started = time.perf_counter()
+        self._cpu_started = time.process_time()
+
+    def record_http_call(self, endpoint: str, milliseconds: float):
+        self.http_calls.setdefault(endpoint, LatencyHistogram()).observe(milliseconds)
+
+    def finish(self):
+        self.attributes["wall_ms"] = (time.perf_counter() - self._wall_started) * 1000
+        self.attributes["cpu_ms"] = (time.process_time() - self._cpu_started) * 1000
+        self.attributes["process_high_water_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        if self._traced_at_start is not None and tracemalloc.is_tracing():
+            peak = max(tracemalloc.get_traced_memory()[1], self._carried_peak)
+            self.attributes["peak_traced_mb"] = (peak - self._traced_at_start) / 1024 / 1024
+            if self._parent is not None:
+                self._parent._carried_peak = max(self._parent._carried_peak, peak)
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            **self.attributes,
+            "http_calls": {endpoint: histogram.to_dict() for endpoint, histogram in self.http_calls.items()},
+        }
+
+
+class LogExporter:
+    def export(self, span: Span):
+        logging.info(f"TELEMETRY {json.dumps(span.to_dict())}")
+
+
+class FileExporter:
+    def __init__(self, path: Union[Path, str]):
+        self.path = Path(path)
+        self.path.parent.mkdir(exist_ok=True, parents=True)
+
+    def export(self, span: Span):
+        try:
+            with open(self.path, "a") as f:
+                f.write(json.dumps(span.to_dict()) + "\n")
+        except Exception as e:
+            logging.error(f"Failed to export span: {e}")
+
+
+class InMemoryExporter:
+    def __init__(self):
+        self.spans = []
+
+    def export(self, span: Span):
+        self.spans.append(span.to_dict())
+
+
+_exporter = LogExporter()
+
+
+def set_exporter(exporter):
+    global _exporter
+    previous, _exporter = _exporter, exporter
+    return previous
+
+
+def _row_count(result) -> Optional[int]:
+    if isinstance(result, tuple) and result and isinstance(result[-1], str):
+        try:
+            return json.loads(result[-1]).get("PROCEDURE_OUTPUT_DATA")
+        except (ValueError, AttributeError):
+            return None
+    return None
+
+
+def _start_memory_trace() -> bool:
+    global _memory_traces
+    with _memory_traces_lock:
+        if _memory_traces == 0 and tracemalloc.is_tracing():
+            return False
+        if _memory_traces == 0:
+            tracemalloc.start()
+        _memory_traces += 1
+        return True
+
+
+def _stop_memory_trace():
+    global _memory_traces
+    with _memory_traces_lock:
+        _memory_traces -= 1
+        if _memory_traces == 0:
+            tracemalloc.stop()
+
+
+@contextmanager
+def message_trace(
+    name: str,
+    message_id: Optional[str] = None,
+    sample_rate: Optional[float] = None,
+    trace_memory: Optional[bool] = None,
+):
+    settings = get_settings()
+    rate = settings.sample_rate if sample_rate is None else sample_rate
+    sampled = random.random() < rate
+    trace_memory = settings.trace_memory if trace_memory is None else trace_memory
+    memory_traced = sampled and trace_memory and _start_memory_trace()
+    span = Span(name, trace_id=message_id or uuid4().hex, sampled=sampled)
+    token = _current_span.set(span)
+    try:
+        yield span
+    except Exception as e:
+        span.attributes["error"] = repr(e)
+        raise
+    finally:
+        _current_span.reset(token)
+        if span.sampled:
+            span.finish()
+            _exporter.export(span)
+        if memory_traced:
+            _stop_memory_trace()
+
+
+def instrumented_step(step_name: str) -> Callable:
+    def decorator(func: Callable) -> Callable:
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            parent = _current_span.get()
+            if parent is None:
+                with message_trace(step_name):
+                    return wrapper(*args, **kwargs)
+            if not parent.sampled:
+                return func(*args, **kwargs)
+
+            span = Span(step_name, trace_id=parent.trace_id, parent=parent)
+            token = _current_span.set(span)
+            try:
+                result = func(*args, **kwargs)
+                span.attributes["row_count"] = _row_count(result)
+                return result
+            except Exception as e:
+                span.attributes["error"] = repr(e)
+                raise
+            finally:
+                _current_span.reset(token)
+                span.finish()
+                _exporter.export(span)
+
+        return wrapper
+
+    return decorator
+
+
+@contextmanager
+def http_call_timer(endpoint: str):
+    span = _current_span.get()
+    if span is None or not span.sampled:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        span.record_http_call(endpoint, (time.perf_counter() - started) * 1000)
@@ -0,0 +1,118 @@
+import json
+import pytest
+import tracemalloc
+
+from case13 import InMemoryExporter, instrumented_step, http_call_timer, message_trace, set_exporter
+
+
+@pytest.fixture
+def exporter():
+    collector = InMemoryExporter()
+    previous = set_exporter(collector)
+    yield collector
+    set_exporter(previous)
+
+
+@instrumented_step("Calling API")
+def _step_with_http_calls(calls):
+    for _ in range(calls):
+        with http_call_timer("/search/fuzzy/json"):
+            pass
+    return None, json.dumps({"PROCEDURE_OUTPUT_DATA": calls})
+
+
+@instrumented_step("Allocating step")
+def _allocating_step(size):
+    data = bytearray(size)
+    return None, json.dumps({"PROCEDURE_OUTPUT_DATA": len(data)})
+
+
+@instrumented_step("Failing step")
+def _failing_step():
+    raise ValueError("boom")
+
+
+def test_steps_of_one_message_are_linked(exporter):
+    with message_trace("Queue message", message_id="msg-1", sample_rate=1.0) as root:
+        _step_with_http_calls(3)
+        _step_with_http_calls(1)
+
+    steps, message = exporter.spans[:2], exporter.spans[2]
+    assert message["span_id"] == root.span_id
+    assert [step["parent_id"] for step in steps] == [root.span_id, root.span_id]
+    assert {span["trace_id"] for span in exporter.spans} == {"msg-1"}
+    assert [step["row_count"] for step in steps] == [3, 1]
+    assert steps[0]["http_calls"]["/search/fuzzy/json"]["count"] == 3
+    assert steps[0]["wall_ms"] >= 0 and steps[0]["cpu_ms"] >= 0
+
+
+def test_unsampled_message_exports_nothing(exporter):
+    with message_trace("Queue message", sample_rate=0.0):
+        assert _step_with_http_calls(2)[0] is None
+
+    assert exporter.spans == []
+
+
+def test_step_without_message_trace_is_its_own_trace(exporter):
+    _step_with_http_calls(1)
+
+    step, root = exporter.spans
+    assert step["parent_id"] == root["span_id"]
+    assert step["trace_id"] == root["trace_id"]
+
+
+def test_failing_step_records_error(exporter):
+    with pytest.raises(ValueError):
+        with message_trace("Queue message", sample_rate=1.0):
+            _failing_step()
+
+    step, message = exporter.spans
+    assert step["error"] == "ValueError('boom')"
+    assert message["error"] == "ValueError('boom')"
+
+
+def test_peak_memory_is_measured_per_span(exporter):
+    tracemalloc.start()
+    try:
+        with message_trace("Queue message", sample_rate=1.0):
+            data = bytearray(8 * 1024 * 1024)
+            del data
+            _allocating_step(1024 * 1024)
+    finally:
+        tracemalloc.stop()
+
+    step, message = exporter.spans
+    assert 1 <= step["peak_traced_mb"] < 2
+    assert message["peak_traced_mb"] >= 8
+    assert "process_high_water_rss_mb" in step
+
+
+def test_child_peak_is_carried_to_parent(exporter):
+    tracemalloc.start()
+    try:
+        with message_trace("Queue message", sample_rate=1.0):
+            _allocating_step(8 * 1024 * 1024)
+            _allocating_step(1024)
+    finally:
+        tracemalloc.stop()
+
+    large_step, small_step, message = exporter.spans
+    assert large_step["peak_traced_mb"] >= 8
+    assert small_step["peak_traced_mb"] < 1
+    assert message["peak_traced_mb"] >= 8
+
+
+def test_message_trace_starts_memory_tracing_when_enabled(exporter):
+    with message_trace("Queue message", sample_rate=1.0, trace_memory=True):
+        assert tracemalloc.is_tracing()
+        _allocating_step(1024 * 1024)
+
+    assert not tracemalloc.is_tracing()
+    step, message = exporter.spans
+    assert step["peak_traced_mb"] >= 1
+    assert message["peak_traced_mb"] >= 1
+
+
+def test_unsampled_message_does_not_trace_memory(exporter):
+    with message_trace("Queue message", sample_rate=0.0, trace_memory=True):
+        assert not tracemalloc.is_tracing()
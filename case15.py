@@ -0,0 +1,89 @@
+import argparse
+import json
+import re
+import subprocess
+import sys
+
+from pathlib import Path
+from statistics import median
+from typing import Union
+
+IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)$")
+DEFAULT_MODULES = ["case7", "case8"]
+DEFAULT_BUDGETS_PATH = Path(__file__).parent / "import_time_budgets.json"
+
+
+def measure_import_time(module: str, cwd: Union[Path, str] = None) -> dict:
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=cwd,
+        capture_output=True,
+        text=True,
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed: {completed.stderr.strip().splitlines()[-1]}")
+
+    imports = parse_importtime(completed.stderr)
+    return {"cumulative_us": imports[module]["cumulative_us"], "imports": imports}
+
+
+def parse_importtime(output: str) -> dict:
+    imports = {}
+    for line in output.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            imports[name] = {"self_us": int(self_us), "cumulative_us": int(cumulative_us), "depth": len(indent) // 2}
+    return imports
+
+
+def top_imports(measurement: dict, count: int = 10) -> list[tuple[str, int]]:
+    ranked = sorted(measurement["imports"].items(), key=lambda item: item[1]["cumulative_us"], reverse=True)
+    return [(name, timing["cumulative_us"]) for name, timing in ranked if timing["depth"] == 1][:count]
+
+
+def check_budgets(results: dict, budgets: dict, tolerance: float) -> list[str]:
+    regressions = []
+    for module, cumulative_us in results.items():
+        budget = budgets.get(module)
+        if budget is None:
+            regressions.append(f"{module}: no budget, run with --update to record one")
+        elif cumulative_us > budget * (1 + tolerance):
+            regressions.append(f"{module}: {cumulative_us / 1000:.1f} ms > budget {budget / 1000:.1f} ms")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import-time regression gate based on python -X importtime")
+    parser.add_argument("modules", nargs="*", default=DEFAULT_MODULES)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budgets", type=Path, default=DEFAULT_BUDGETS_PATH)
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument("--update", action="store_true", help="Store the measured times as the new budgets")
+    args = parser.parse_args()
+
+    results = {}
+    for module in args.modules:
+        measurements = [measure_import_time(module, cwd=Path(__file__).parent) for _ in range(args.runs)]
+        results[module] = median(measurement["cumulative_us"] for measurement in measurements)
+        print(f"{module}: {results[module] / 1000:.1f} ms")
+        for name, cumulative_us in top_imports(measurements[-1]):
+            print(f"    {name}: {cumulative_us / 1000:.1f} ms")
+
+    if args.update:
+        args.budgets.write_text(json.dumps(results, indent=2))
+        return
+
+    if not args.budgets.exists():
+        print(f"No import-time budgets at {args.budgets}, run with --update to create them")
+        sys.exit(1)
+
+    regressions = check_budgets(results, json.loads(args.budgets.read_text()), args.tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()  # pragma: no cover
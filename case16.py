@@ -0,0 +1,241 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+import threading
+import time
+
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Callable, Iterator, NamedTuple, Optional, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from requests import Session
+    from snowflake.connector import SnowflakeConnection
+
+EXPIRED_SESSION_ERRNOS = {390112, 390114}
+
+
+class Settings(NamedTuple):
+    snowflake_max_age_seconds: int
+    snowflake_heartbeat_seconds: int
+    http_session_max_age_seconds: int
+    http_pool_size: int
+
+
+@lru_cache(maxsize=None)
+def get_settings() -> Settings:
+    return Settings(
+        snowflake_max_age_seconds=int(os.getenv("SnowflakeConnectionMaxAgeSeconds", "3600")),
+        snowflake_heartbeat_seconds=int(os.getenv("SnowflakeHeartbeatSeconds", "300")),
+        http_session_max_age_seconds=int(os.getenv("HttpSessionMaxAgeSeconds", "900")),
+        http_pool_size=int(os.getenv("HttpPoolSize", "10")),
+    )
+
+
+def _create_snowflake_connection() -> SnowflakeConnection:
+    import snowflake.connector
+
+    return snowflake.connector.connect(
+        user=os.getenv("SnowflakeUser"),
+        password=os.getenv("SnowflakePassword"),
+        account=os.getenv("SnowflakeAccount"),
+        database=os.getenv("ReferenceDb"),
+        warehouse=os.getenv("SnowflakeWarehouse"),
+        client_session_keep_alive=True,
+    )
+
+
+def _create_http_session() -> Session:
+    from requests import Session
+    from requests.adapters import HTTPAdapter
+
+    session = Session()
+    pool_size = get_settings().http_pool_size
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def _is_expired_session_error(error: Exception) -> bool:
+    return getattr(error, "errno", None) in EXPIRED_SESSION_ERRNOS
+
+
+class _PooledResource:
+    def __init__(self, name: str, factory: Callable, max_age_seconds: float, clock: Callable[[], float]):
+        self.name = name
+        self.factory = factory
+        self.max_age_seconds = max_age_seconds
+        self.clock = clock
+        self.resource = None
+        self.leases = 0
+        self.created_at = 0.0
+        self.last_used_at = 0.0
+        self._retired = {}
+
+    def is_expired(self) -> bool:
+        return self.clock() - self.created_at >= self.max_age_seconds
+
+    def idle_seconds(self) -> float:
+        return self.clock() - self.last_used_at
+
+    def create(self):
+        self.resource = self.factory()
+        self.created_at = self.last_used_at = self.clock()
+        return self.resource
+
+    def retire(self):
+        # A resource that is still leased by another invocation is closed by the last release() instead
+        if self.resource is None:
+            return
+        if self.leases:
+            self._retired[id(self.resource)] = [self.resource, self.leases]
+        else:
+            self._close(self.resource)
+        self.resource = None
+        self.leases = 0
+
+    def release(self, resource):
+        if resource is self.resource:
+            self.leases -= 1
+            return
+        retired = self._retired.get(id(resource))
+        if retired is None:
+            return
+        retired[1] -= 1
+        if retired[1] == 0:
+            del self._retired[id(resource)]
+            self._close(resource)
+
+    def close(self):
+        for resource, _ in self._retired.values():
+            self._close(resource)
+        self._retired = {}
+        if self.resource is not None:
+            self._close(self.resource)
+        self.resource = None
+        self.leases = 0
+
+    def _close(self, resource):
+        try:
+            resource.close()
+        except Exception as e:
+            logging.warning(f"Failed to close {self.name}: {e}")
+
+
+class ResourceManager:
+    def __init__(
+        self,
+        snowflake_factory: Callable[[], SnowflakeConnection] = _create_snowflake_connection,
+        session_factory: Callable[[], Session] = _create_http_session,
+        snowflake_max_age_seconds: Optional[float] = None,
+        snowflake_heartbeat_seconds: Optional[float] = None,
+        session_max_age_seconds: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        settings = get_settings()
+        if snowflake_max_age_seconds is None:
+            snowflake_max_age_seconds = settings.snowflake_max_age_seconds
+        if snowflake_heartbeat_seconds is None:
+            snowflake_heartbeat_seconds = settings.snowflake_heartbeat_seconds
+        if session_max_age_seconds is None:
+            session_max_age_seconds = settings.http_session_max_age_seconds
+        self._snowflake = _PooledResource("snowflake", snowflake_factory, snowflake_max_age_seconds, clock)
+        self._session = _PooledResource("http_session", session_factory, session_max_age_seconds, clock)
+        self.snowflake_heartbeat_seconds = snowflake_heartbeat_seconds
+        self.metrics = {
+            "snowflake_fresh": 0,
+            "snowflake_reused": 0,
+            "snowflake_recycled": 0,
+            "snowflake_reconnects": 0,
+            "http_session_fresh": 0,
+            "http_session_reused": 0,
+            "http_session_recycled": 0,
+        }
+        self._lock = threading.Lock()
+
+    def _acquire(self, pooled: _PooledResource, heartbeat_seconds: Optional[float] = None) -> tuple[object, bool]:
+        if pooled.resource is not None and pooled.is_expired():
+            pooled.retire()
+            self.metrics[f"{pooled.name}_recycled"] += 1
+
+        if pooled.resource is None:
+            self.metrics[f"{pooled.name}_fresh"] += 1
+            pooled.create()
+            needs_heartbeat = False
+        else:
+            self.metrics[f"{pooled.name}_reused"] += 1
+            needs_heartbeat = heartbeat_seconds is not None and pooled.idle_seconds() >= heartbeat_seconds
+            pooled.last_used_at = pooled.clock()
+        pooled.leases += 1
+        return pooled.resource, needs_heartbeat
+
+    @contextmanager
+    def _lease(self, pooled: _PooledResource, heartbeat_seconds: Optional[float] = None, is_alive: Callable = None):
+        with self._lock:
+            resource, needs_heartbeat = self._acquire(pooled, heartbeat_seconds)
+        # The heartbeat is a network round trip, run it without blocking leases of other invocations
+        if is_alive is not None and not is_alive(resource, needs_heartbeat):
+            with self._lock:
+                pooled.release(resource)
+                if pooled.resource is resource:
+                    pooled.retire()
+                    self.metrics[f"{pooled.name}_reconnects"] += 1
+                resource, _ = self._acquire(pooled)
+        try:
+            yield resource
+        finally:
+            with self._lock:
+                pooled.release(resource)
+
+    @staticmethod
+    def _snowflake_is_alive(connection: SnowflakeConnection, needs_heartbeat: bool) -> bool:
+        if connection.is_closed():
+            return False
+        if not needs_heartbeat:
+            return True
+        try:
+            connection.cursor().execute("SELECT 1")
+        except Exception as e:
+            logging.info(f"Snowflake heartbeat failed, reconnecting: {e}")
+            return False
+        return True
+
+    def snowflake_connection(self) -> Iterator[SnowflakeConnection]:
+        return self._lease(self._snowflake, self.snowflake_heartbeat_seconds, self._snowflake_is_alive)
+
+    def http_session(self) -> Iterator[Session]:
+        return self._lease(self._session)
+
+    def run_on_snowflake(self, func: Callable[[SnowflakeConnection], object]):
+        with self.snowflake_connection() as connection:
+            try:
+                return func(connection)
+            except Exception as e:
+                if not _is_expired_session_error(e):
+                    raise
+                logging.info(f"Snowflake session expired, reconnecting: {e}")
+                with self._lock:
+                    if self._snowflake.resource is connection:
+                        self._snowflake.retire()
+                        self.metrics["snowflake_reconnects"] += 1
+        with self.snowflake_connection() as connection:
+            return func(connection)
+
+    def emit_metrics(self):
+        with self._lock:
+            metrics = dict(self.metrics)
+        logging.info(f"RESOURCE_METRICS {json.dumps(metrics)}")
+        return metrics
+
+    def close(self):
+        with self._lock:
+            self._snowflake.close()
+            self._session.close()
+
+
+@lru_cache(maxsize=None)
+def get_resource_manager() -> ResourceManager:
+    return ResourceManager()
@@ -0,0 +1,170 @@
+import logging
+import pytest
+
+from case16 import ResourceManager
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeCursor:
+    def __init__(self, connection):
+        self.connection = connection
+
+    def execute(self, query):
+        if self.connection.broken:
+            raise ConnectionError("connection reset")
+        self.connection.queries.append(query)
+        return self
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = False
+        self.broken = False
+        self.queries = []
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def is_closed(self):
+        return self.closed
+
+    def close(self):
+        self.closed = True
+
+
+class ExpiredTokenError(Exception):
+    errno = 390114
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def manager(clock):
+    return ResourceManager(
+        snowflake_factory=FakeConnection,
+        session_factory=FakeConnection,
+        snowflake_max_age_seconds=3600,
+        snowflake_heartbeat_seconds=300,
+        session_max_age_seconds=900,
+        clock=clock,
+    )
+
+
+def _acquire_and_release(lease):
+    with lease as resource:
+        return resource
+
+
+def test_connection_is_reused_between_invocations(manager):
+    first = _acquire_and_release(manager.snowflake_connection())
+    second = _acquire_and_release(manager.snowflake_connection())
+
+    assert first is second
+    assert manager.metrics["snowflake_fresh"] == 1
+    assert manager.metrics["snowflake_reused"] == 1
+
+
+def test_connection_is_recycled_after_max_age(manager, clock):
+    first = _acquire_and_release(manager.snowflake_connection())
+    clock.now = 3600
+
+    second = _acquire_and_release(manager.snowflake_connection())
+
+    assert first is not second
+    assert first.closed
+    assert manager.metrics["snowflake_recycled"] == 1
+
+
+def test_recycled_connection_is_closed_only_after_last_release(manager, clock):
+    with manager.snowflake_connection() as first:
+        clock.now = 3600
+        with manager.snowflake_connection() as second:
+            assert second is not first
+            assert not first.closed
+        assert not first.closed
+    assert first.closed
+    assert not second.closed
+
+
+def test_heartbeat_runs_only_after_idle_period(manager, clock):
+    connection = _acquire_and_release(manager.snowflake_connection())
+    clock.now = 100
+    _acquire_and_release(manager.snowflake_connection())
+    assert connection.queries == []
+
+    clock.now = 500
+    assert _acquire_and_release(manager.snowflake_connection()) is connection
+    assert connection.queries == ["SELECT 1"]
+
+
+def test_heartbeat_runs_without_holding_the_manager_lock(manager, clock):
+    connection = _acquire_and_release(manager.snowflake_connection())
+    lock_held = []
+    connection.cursor = lambda: lock_held.append(manager._lock.locked()) or FakeCursor(connection)
+    clock.now = 500
+
+    _acquire_and_release(manager.snowflake_connection())
+
+    assert lock_held == [False]
+
+
+def test_failed_heartbeat_reconnects(manager, clock):
+    connection = _acquire_and_release(manager.snowflake_connection())
+    connection.broken = True
+    clock.now = 500
+
+    assert _acquire_and_release(manager.snowflake_connection()) is not connection
+    assert manager.metrics["snowflake_reconnects"] == 1
+
+
+def test_expired_token_reconnects_and_retries(manager):
+    stale = _acquire_and_release(manager.snowflake_connection())
+
+    def query(connection):
+        if connection is stale:
+            raise ExpiredTokenError("Authentication token has expired")
+        return "ok"
+
+    assert manager.run_on_snowflake(query) == "ok"
+    assert stale.closed
+    assert manager.metrics["snowflake_reconnects"] == 1
+
+
+def test_other_errors_are_not_retried(manager):
+    def query(connection):
+        raise ValueError("bad query")
+
+    with pytest.raises(ValueError):
+        manager.run_on_snowflake(query)
+    assert manager.metrics["snowflake_fresh"] == 1
+
+
+def test_http_session_is_reused_and_recycled(manager, clock):
+    session = _acquire_and_release(manager.http_session())
+    assert _acquire_and_release(manager.http_session()) is session
+
+    clock.now = 900
+    assert _acquire_and_release(manager.http_session()) is not session
+    assert manager.metrics["http_session_fresh"] == 2
+    assert manager.metrics["http_session_reused"] == 1
+    assert manager.metrics["http_session_recycled"] == 1
+
+
+def test_metrics_are_logged(manager, caplog):
+    _acquire_and_release(manager.http_session())
+
+    with caplog.at_level(logging.INFO):
+        metrics = manager.emit_metrics()
+
+    assert metrics["http_session_fresh"] == 1
+    assert 'RESOURCE_METRICS {"snowflake_fresh": 0' in caplog.text
@@ -0,0 +1,243 @@
+import json
+
+from datetime import datetime
+from decimal import Decimal
+from typing import NamedTuple, Optional
+
+METRICS_TABLE = "internal.data_quality_partition_metrics"
+NO_WATERMARK = datetime(1900, 1, 1)
+
+
+class Expectation(NamedTuple):
+    name: str
+    column: Optional[str] = None
+    min_value: Optional[float] = None
+    max_value: Optional[float] = None
+
+
+# Mirrors the checks of the "Great Expectations for Traffic data" feature with the expectation types that can be
+# computed from per-partition aggregates. A suite exported by Great Expectations can be used instead through
+# expectations_from_suite().
+_STAGING_EXPECTATIONS = [
+    Expectation("expect_table_row_count_to_be_between", min_value=1),
+    Expectation("expect_column_values_to_not_be_null", column="file_date"),
+    Expectation("expect_column_values_to_not_be_null", column="load_timestamp"),
+]
+_COMBINED_EXPECTATIONS = _STAGING_EXPECTATIONS + [
+    Expectation("expect_column_values_to_not_be_null", column="traffic_id"),
+    Expectation("expect_column_values_to_be_between", column="passengers_total", min_value=0),
+]
+EXPECTATIONS = {
+    "staging.adjusted_preliminary": _STAGING_EXPECTATIONS,
+    "staging.adjusted_final": _STAGING_EXPECTATIONS,
+    "staging.unadjusted_current": _STAGING_EXPECTATIONS,
+    "staging.unadjusted_advanced": _STAGING_EXPECTATIONS,
+    "internal.adjusted_combined": _COMBINED_EXPECTATIONS,
+    "internal.unadjusted_combined": _COMBINED_EXPECTATIONS,
+}
+
+
+SUPPORTED_EXPECTATIONS = {
+    "expect_table_row_count_to_be_between",
+    "expect_column_values_to_not_be_null",
+    "expect_column_values_to_be_between",
+}
+
+
+def expectations_from_suite(suite: dict) -> list[Expectation]:
+    expectations = []
+    for expectation in suite["expectations"]:
+        if expectation["expectation_type"] not in SUPPORTED_EXPECTATIONS:
+            raise ValueError(f"Unsupported expectation {expectation['expectation_type']}")
+        kwargs = expectation.get("kwargs", {})
+        expectations.append(
+            Expectation(
+                expectation["expectation_type"],
+                column=kwargs.get("column"),
+                min_value=kwargs.get("min_value"),
+                max_value=kwargs.get("max_value"),
+            )
+        )
+    return expectations
+
+
+def _required_metrics(expectations: list[Expectation]) -> dict[str, str]:
+    metrics = {"row_count": "count(*)"}
+    for expectation in expectations:
+        if expectation.name == "expect_column_values_to_not_be_null":
+            metrics[f"null_count__{expectation.column}"] = f"count_if({expectation.column} is null)"
+        elif expectation.name == "expect_column_values_to_be_between":
+            metrics[f"min__{expectation.column}"] = f"min({expectation.column})"
+            metrics[f"max__{expectation.column}"] = f"max({expectation.column})"
+        elif expectation.name != "expect_table_row_count_to_be_between":
+            raise ValueError(f"Unsupported expectation {expectation.name}")
+    return metrics
+
+
+def _create_metrics_table(connection):
+    connection.cursor().execute(
+        f"""
+        create table if not exists {METRICS_TABLE} (
+            table_name varchar
+          , file_date date
+          , load_timestamp timestamp_ntz
+          , metrics variant
+          , validated_at timestamp_ntz
+        )
+        """
+    )
+
+
+def _cached_partitions(connection, table: str) -> list[dict]:
+    rows = (
+        connection.cursor()
+        .execute(
+            f"""
+            select metrics, load_timestamp
+            from {METRICS_TABLE}
+            where table_name = %(table)s
+            """,
+            {"table": table},
+        )
+        .fetchall()
+    )
+    return [{"metrics": json.loads(metrics), "load_timestamp": load_timestamp} for metrics, load_timestamp in rows]
+
+
+def _compute_partition_metrics(connection, table: str, metrics: dict[str, str], watermark: datetime) -> list[dict]:
+    expressions = "\n              , ".join(f"{expression} as {name}" for name, expression in metrics.items())
+    cursor = connection.cursor().execute(
+        f"""
+            select file_date
+              , load_timestamp
+              , {expressions}
+            from identifier(%(table)s)
+            where load_timestamp > %(watermark)s
+                or load_timestamp is null
+            group by file_date, load_timestamp
+        """,
+        {"table": table, "watermark": watermark},
+    )
+    names = [column[0].lower() for column in cursor.description]
+    partitions = []
+    for row in cursor.fetchall():
+        values = dict(zip(names, row))
+        partitions.append(
+            {
+                "file_date": values.pop("file_date"),
+                "load_timestamp": values.pop("load_timestamp"),
+                "metrics": json.loads(json.dumps(values, default=_json_default)),
+            }
+        )
+    return partitions
+
+
+def _json_default(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    return str(value)
+
+
+def _store_partition_metrics(connection, table: str, partitions: list[dict], replace: bool):
+    cursor = connection.cursor()
+    if replace:
+        cursor.execute(f"delete from {METRICS_TABLE} where table_name = %(table)s", {"table": table})
+    # Rows without load_timestamp are never cached, they are scanned again until they are fixed
+    partitions = [partition for partition in partitions if partition["load_timestamp"] is not None]
+    if not partitions:
+        return
+
+    params = {"table": table}
+    rows = []
+    for index, partition in enumerate(partitions):
+        params[f"file_date_{index}"] = partition["file_date"]
+        params[f"load_timestamp_{index}"] = partition["load_timestamp"]
+        params[f"metrics_{index}"] = json.dumps(partition["metrics"])
+        rows.append(f"(%(file_date_{index})s, %(load_timestamp_{index})s, %(metrics_{index})s)")
+    values = "\n              , ".join(rows)
+    cursor.execute(
+        f"""
+            insert into {METRICS_TABLE} (table_name, file_date, load_timestamp, metrics, validated_at)
+            select %(table)s, column1, column2, parse_json(column3), current_timestamp()
+            from values {values}
+        """,
+        params,
+    )
+
+
+def combine_partition_metrics(partitions: list[dict]) -> dict:
+    combined = {}
+    for partition in partitions:
+        for name, value in partition["metrics"].items():
+            if value is None:
+                combined.setdefault(name, None)
+            elif combined.get(name) is None:
+                combined[name] = value
+            elif name.startswith("min__"):
+                combined[name] = min(combined[name], value)
+            elif name.startswith("max__"):
+                combined[name] = max(combined[name], value)
+            else:
+                combined[name] += value
+    return combined
+
+
+def evaluate_expectations(expectations: list[Expectation], metrics: dict) -> list[dict]:
+    results = []
+    for expectation in expectations:
+        if expectation.name == "expect_table_row_count_to_be_between":
+            observed = metrics.get("row_count", 0)
+            success = _is_between(observed, expectation.min_value, expectation.max_value)
+        elif expectation.name == "expect_column_values_to_not_be_null":
+            observed = metrics.get(f"null_count__{expectation.column}", 0)
+            success = observed == 0
+        else:
+            observed = [metrics.get(f"min__{expectation.column}"), metrics.get(f"max__{expectation.column}")]
+            success = all(
+                _is_between(value, expectation.min_value, expectation.max_value)
+                for value in observed
+                if value is not None
+            )
+        results.append(
+            {
+                "expectation": expectation.name,
+                "column": expectation.column,
+                "success": success,
+                "observed_value": observed,
+            }
+        )
+    return results
+
+
+def _is_between(value, min_value, max_value) -> bool:
+    return (min_value is None or value >= min_value) and (max_value is None or value <= max_value)
+
+
+def reset_partition_metrics(connection):
+    _create_metrics_table(connection)
+    connection.cursor().execute(f"truncate table {METRICS_TABLE}")
+
+
+def validate_table(connection, table: str, expectations: list[Expectation]) -> list[dict]:
+    metrics = _required_metrics(expectations)
+    cached = _cached_partitions(connection, table)
+    full_refresh = any(not metrics.keys() <= partition["metrics"].keys() for partition in cached)
+    if full_refresh:
+        cached = []
+    watermark = max(
+        (partition["load_timestamp"] for partition in cached if partition["load_timestamp"] is not None),
+        default=NO_WATERMARK,
+    )
+
+    new_partitions = _compute_partition_metrics(connection, table, metrics, watermark)
+    _store_partition_metrics(connection, table, new_partitions, replace=full_refresh)
+
+    return evaluate_expectations(expectations, combine_partition_metrics(cached + new_partitions))
+
+
+def validate_incrementally(connection, expectations: dict[str, list[Expectation]] = None) -> dict[str, list[dict]]:
+    _create_metrics_table(connection)
+    return {
+        table: validate_table(connection, table, table_expectations)
+        for table, table_expectations in (expectations or EXPECTATIONS).items()
+    }
@@ -0,0 +1,165 @@
+import json
+import pytest
+
+from datetime import datetime
+from case18 import (
+    Expectation,
+    combine_partition_metrics,
+    evaluate_expectations,
+    expectations_from_suite,
+    validate_table,
+)
+
+EXPECTATIONS = [
+    Expectation("expect_table_row_count_to_be_between", min_value=1),
+    Expectation("expect_column_values_to_not_be_null", column="traffic_id"),
+    Expectation("expect_column_values_to_be_between", column="passengers_total", min_value=0),
+]
+
+
+class FakeCursor:
+    def __init__(self, warehouse):
+        self.warehouse = warehouse
+        self.description = []
+        self.rows = []
+
+    def execute(self, query, params=None):
+        self.warehouse.queries.append(query)
+        if "from identifier" in query:
+            self.description = [(name.upper(),) for name in self.warehouse.partition_columns]
+            self.rows = [row for row in self.warehouse.partitions if row[1] is None or row[1] > params["watermark"]]
+        elif query.strip().startswith("select metrics"):
+            self.rows = [(json.dumps(metrics), load_timestamp) for metrics, load_timestamp in self.warehouse.cache]
+        elif query.strip().startswith("insert"):
+            self.warehouse.inserts += 1
+            rows = sum(name.startswith("metrics_") for name in params)
+            for index in range(rows):
+                self.warehouse.cache.append(
+                    (json.loads(params[f"metrics_{index}"]), params[f"load_timestamp_{index}"])
+                )
+        return self
+
+    def fetchall(self):
+        return self.rows
+
+
+class FakeWarehouse:
+    partition_columns = [
+        "file_date",
+        "load_timestamp",
+        "row_count",
+        "null_count__traffic_id",
+        "min__passengers_total",
+        "max__passengers_total",
+    ]
+
+    def __init__(self):
+        self.partitions = []
+        self.cache = []
+        self.queries = []
+        self.inserts = 0
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def scans(self):
+        return sum("from identifier" in query for query in self.queries)
+
+
+def test_combine_partition_metrics():
+    partitions = [
+        {
+            "metrics": {
+                "row_count": 2,
+                "null_count__traffic_id": 0,
+                "min__passengers_total": 3,
+                "max__passengers_total": 9,
+            }
+        },
+        {
+            "metrics": {
+                "row_count": 5,
+                "null_count__traffic_id": 1,
+                "min__passengers_total": 1,
+                "max__passengers_total": 4,
+            }
+        },
+    ]
+
+    assert combine_partition_metrics(partitions) == {
+        "row_count": 7,
+        "null_count__traffic_id": 1,
+        "min__passengers_total": 1,
+        "max__passengers_total": 9,
+    }
+
+
+def test_evaluate_expectations():
+    results = evaluate_expectations(
+        EXPECTATIONS,
+        {"row_count": 7, "null_count__traffic_id": 1, "min__passengers_total": -1, "max__passengers_total": 9},
+    )
+
+    assert [result["success"] for result in results] == [True, False, False]
+
+
+def test_only_new_partitions_are_scanned():
+    warehouse = FakeWarehouse()
+    warehouse.partitions = [("2020-01-01", datetime(2020, 1, 2), 10, 0, 1, 5)]
+    validate_table(warehouse, "internal.adjusted_combined", EXPECTATIONS)
+
+    warehouse.partitions.append(("2020-02-01", datetime(2020, 2, 2), 4, 0, 0, 8))
+    results = validate_table(warehouse, "internal.adjusted_combined", EXPECTATIONS)
+
+    assert warehouse.scans() == 2
+    assert len(warehouse.cache) == 2
+    assert results[0]["observed_value"] == 14
+    assert results[2]["observed_value"] == [0, 8]
+
+
+def test_new_partitions_are_stored_in_one_insert():
+    warehouse = FakeWarehouse()
+    warehouse.partitions = [
+        ("2020-01-01", datetime(2020, 1, 2), 10, 0, 1, 5),
+        ("2020-02-01", datetime(2020, 2, 2), 4, 0, 0, 8),
+        ("2020-03-01", datetime(2020, 3, 2), 6, 0, 2, 7),
+    ]
+
+    validate_table(warehouse, "internal.adjusted_combined", EXPECTATIONS)
+
+    assert warehouse.inserts == 1
+    assert [load_timestamp.month for _, load_timestamp in warehouse.cache] == [1, 2, 3]
+
+
+def test_expectations_from_suite():
+    suite = {
+        "expectation_suite_name": "traffic_data",
+        "expectations": [
+            {"expectation_type": "expect_table_row_count_to_be_between", "kwargs": {"min_value": 1}},
+            {"expectation_type": "expect_column_values_to_not_be_null", "kwargs": {"column": "traffic_id"}},
+            {
+                "expectation_type": "expect_column_values_to_be_between",
+                "kwargs": {"column": "passengers_total", "min_value": 0},
+            },
+        ],
+    }
+
+    assert expectations_from_suite(suite) == EXPECTATIONS
+
+    suite["expectations"].append({"expectation_type": "expect_column_values_to_match_regex", "kwargs": {}})
+    with pytest.raises(ValueError):
+        expectations_from_suite(suite)
+
+
+def test_rows_without_load_timestamp_fail_on_every_run():
+    expectations = [Expectation("expect_column_values_to_not_be_null", column="load_timestamp")]
+    warehouse = FakeWarehouse()
+    warehouse.partition_columns = ["file_date", "load_timestamp", "row_count", "null_count__load_timestamp"]
+    warehouse.partitions = [("2020-01-01", datetime(2020, 1, 2), 10, 0), ("2020-01-01", None, 2, 2)]
+
+    first = validate_table(warehouse, "staging.adjusted_final", expectations)
+    second = validate_table(warehouse, "staging.adjusted_final", expectations)
+
+    assert [result["success"] for result in first + second] == [False, False]
+    assert second[0]["observed_value"] == 2
+    assert [load_timestamp for _, load_timestamp in warehouse.cache] == [datetime(2020, 1, 2)]
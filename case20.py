@@ -0,0 +1,208 @@
+import json
+import logging
+import os
+
+from pathlib import Path
+from typing import Callable, Optional, Union
+
+BENCHMARK_MULTIPLIER = int(os.getenv("PROCEDURE_BENCHMARK_MULTIPLIER", "0"))
+UPDATE_BASELINE = os.getenv("PROCEDURE_BENCHMARK_UPDATE_BASELINE") == "1"
+DEFAULT_BASELINE_PATH = Path(__file__).parent / "procedure_benchmark_baseline.json"
+TOLERANCES = {
+    "elapsed_ms": 0.5,
+    "bytes_scanned": 0.2,
+    "bytes_spilled": 0.2,
+    "partitions_pruned_ratio": 0.1,
+}
+HIGHER_IS_BETTER = {"partitions_pruned_ratio"}
+KEY_STRIDE = 1_000_000_000
+TEXT_TYPES = {"TEXT", "VARCHAR", "STRING", "CHAR", "CHARACTER"}
+NUMBER_TYPES = {"NUMBER", "DECIMAL", "NUMERIC", "INT", "INTEGER", "BIGINT", "SMALLINT", "FIXED"}
+
+
+def benchmark_enabled() -> bool:
+    return BENCHMARK_MULTIPLIER > 0
+
+
+class ProcedureBenchmark:
+    def __init__(
+        self,
+        connection,
+        multiplier: int = BENCHMARK_MULTIPLIER,
+        baseline_path: Union[Path, str] = DEFAULT_BASELINE_PATH,
+        tolerances: dict = None,
+    ):
+        self.connection = connection
+        self.multiplier = multiplier
+        self.baseline_path = Path(baseline_path)
+        self.tolerances = tolerances or TOLERANCES
+        self.results = {}
+
+    def scale_tables(self, tables: list[str], key_columns: list[str] = None):
+        if self.multiplier <= 1:
+            return
+        column_types = {table: self._column_types(table) for table in tables}
+        if key_columns is None:
+            key_columns = _shared_columns(column_types.values())
+        key_columns = set(key_columns) - self._text_keys_without_room(column_types, key_columns)
+
+        # Key columns get a per-copy offset, so copy n of one table only joins copy n of the others and the
+        # join output grows with the multiplier instead of its square
+        for table in tables:
+            offsets = [
+                _offset_expression(column, data_type)
+                for column, (data_type, _) in column_types[table].items()
+                if column in key_columns
+            ]
+            offsets = [offset for offset in offsets if offset is not None]
+            replace = f" replace ({', '.join(offsets)})" if offsets else ""
+            self.connection.cursor().execute(
+                f"""
+                insert into identifier(%(table)s)
+                select t.*{replace}
+                from identifier(%(table)s) as t
+                   , (select seq4() + 1 as copy from table(generator(rowcount => %(copies)s))) as g
+                """,
+                {"table": table, "copies": self.multiplier - 1, "key_stride": KEY_STRIDE},
+            )
+
+    def _text_keys_without_room(self, column_types: dict, key_columns) -> set[str]:
+        # A text key that cannot hold the ~<copy> suffix in every table is left as is everywhere, offsetting it
+        # in only some tables would stop the copies from joining at all
+        suffix_length = len(f"~{self.multiplier - 1}")
+        without_room = set()
+        for table, columns in column_types.items():
+            text_keys = {
+                column: max_length
+                for column, (data_type, max_length) in columns.items()
+                if column in key_columns and data_type in TEXT_TYPES and max_length is not None
+            }
+            for column, longest in self._longest_values(table, list(text_keys)).items():
+                if (longest or 0) + suffix_length > text_keys[column]:
+                    without_room.add(column)
+        if without_room:
+            logging.warning(f"Not offsetting key columns too short for the copy suffix: {sorted(without_room)}")
+        return without_room
+
+    def _longest_values(self, table: str, columns: list[str]) -> dict[str, int]:
+        if not columns:
+            return {}
+        lengths = ", ".join(f'max(length("{column}"))' for column in columns)
+        cursor = self.connection.cursor().execute(f"select {lengths} from identifier(%(table)s)", {"table": table})
+        return dict(zip(columns, cursor.fetchone()))
+
+    def _column_types(self, table: str) -> dict[str, tuple[str, Optional[int]]]:
+        schema, table_name = table.upper().split(".")[-2:]
+        rows = (
+            self.connection.cursor()
+            .execute(
+                """
+                select column_name
+                     , data_type
+                     , character_maximum_length
+                from information_schema.columns
+                where table_schema = %(schema)s
+                    and table_name = %(table_name)s
+                order by ordinal_position
+                """,
+                {"schema": schema, "table_name": table_name},
+            )
+            .fetchall()
+        )
+        return {column: (data_type, max_length) for column, data_type, max_length in rows}
+
+    def _warehouse_now(self):
+        return self.connection.cursor().execute("select current_timestamp()").fetchone()[0]
+
+    def _query_profile(self, started, finished) -> dict:
+        rows = (
+            self.connection.cursor()
+            .execute(
+                """
+                select query_type
+                     , total_elapsed_time
+                     , bytes_scanned
+                     , partitions_scanned
+                     , partitions_total
+                     , bytes_spilled_to_local_storage + bytes_spilled_to_remote_storage
+                from table(
+                    information_schema.query_history_by_session(
+                        end_time_range_start => %(started)s, result_limit => 10000
+                    )
+                )
+                where start_time >= %(started)s
+                    and end_time <= %(finished)s
+                    and query_text not ilike '%%information_schema.query_history%%'
+                """,
+                {"started": started, "finished": finished},
+            )
+            .fetchall()
+        )
+        profile = dict.fromkeys(
+            ["elapsed_ms", "bytes_scanned", "partitions_scanned", "partitions_total", "bytes_spilled"], 0
+        )
+        for query_type, elapsed_ms, bytes_scanned, partitions_scanned, partitions_total, bytes_spilled in rows:
+            if query_type == "CALL":
+                profile["elapsed_ms"] = max(profile["elapsed_ms"], elapsed_ms or 0)
+                continue
+            profile["bytes_scanned"] += bytes_scanned or 0
+            profile["partitions_scanned"] += partitions_scanned or 0
+            profile["partitions_total"] += partitions_total or 0
+            profile["bytes_spilled"] += bytes_spilled or 0
+        profile["partitions_pruned"] = profile["partitions_total"] - profile["partitions_scanned"]
+        profile["partitions_pruned_ratio"] = (
+            profile["partitions_pruned"] / profile["partitions_total"] if profile["partitions_total"] else 1.0
+        )
+        return profile
+
+    def measure(self, procedure_call: Callable, procedure_name: str, **kwargs):
+        started = self._warehouse_now()
+        result = procedure_call(procedure_name=procedure_name, **kwargs)
+        finished = self._warehouse_now()
+        self.results[f"{procedure_name}@x{self.multiplier}"] = self._query_profile(started, finished)
+        return result
+
+    def _read_baseline(self) -> dict:
+        if not self.baseline_path.exists():
+            return {}
+        return json.loads(self.baseline_path.read_text())
+
+    def compare_with_baseline(self) -> list[str]:
+        baseline = self._read_baseline()
+        regressions = []
+        for key, profile in self.results.items():
+            baseline_profile = baseline.get(key)
+            if baseline_profile is None:
+                regressions.append(
+                    f"{key}: no baseline in {self.baseline_path}, run with PROCEDURE_BENCHMARK_UPDATE_BASELINE=1"
+                )
+                continue
+            for metric, tolerance in self.tolerances.items():
+                current, expected = profile[metric], baseline_profile[metric]
+                if metric in HIGHER_IS_BETTER and current < expected * (1 - tolerance):
+                    regressions.append(f"{key} {metric}: {current} < baseline {expected}")
+                elif metric not in HIGHER_IS_BETTER and current > expected * (1 + tolerance):
+                    regressions.append(f"{key} {metric}: {current} > baseline {expected}")
+        return regressions
+
+    def update_baseline(self):
+        baseline = self._read_baseline()
+        baseline.update(self.results)
+        self.baseline_path.write_text(json.dumps(baseline, indent=2, sort_keys=True))
+
+
+def _shared_columns(column_types) -> set[str]:
+    seen, shared = set(), set()
+    for columns in column_types:
+        shared |= seen & columns.keys()
+        seen |= columns.keys()
+    return shared
+
+
+def _offset_expression(column: str, data_type: str) -> Optional[str]:
+    quoted = f'"{column}"'
+    if data_type in TEXT_TYPES:
+        return f"t.{quoted} || '~' || g.copy as {quoted}"
+    if data_type in NUMBER_TYPES:
+        return f"t.{quoted} + g.copy * %(key_stride)s as {quoted}"
+    return None
@@ -0,0 +1,263 @@
+import pytest
+import os
+import re
+
+from datetime import datetime, timedelta
+from case20 import ProcedureBenchmark, benchmark_enabled, UPDATE_BASELINE
+
+benchmark = pytest.mark.skipif(not benchmark_enabled(), reason="Set PROCEDURE_BENCHMARK_MULTIPLIER to run")
+
+
+@pytest.fixture
+def procedure_benchmark(helper):
+    # Runs on the helper's connection so the procedure calls are in the session whose query history is read
+    procedure_benchmark = ProcedureBenchmark(helper.connection)
+    yield procedure_benchmark
+
+    if UPDATE_BASELINE:
+        procedure_benchmark.update_baseline()
+    else:
+        regressions = procedure_benchmark.compare_with_baseline()
+        assert not regressions, "\n".join(regressions)
+
+
+@pytest.fixture
+def scaled_tables(helper):
+    # Registered before loading, so multiplied rows are removed even when scaling or the procedure fails;
+    # the case4 tests insert into the same tables without truncating them first
+    tables = {"truncate": [], "drop": []}
+    yield tables
+    for table in tables["truncate"]:
+        helper.truncate_table(table)
+    for table in tables["drop"]:
+        helper.drop_table(table)
+
+
+@pytest.mark.database
+@benchmark
+def test_benchmark_proc_load_seats_api_training_data(helper, procedure_benchmark, scaled_tables):
+    helper.truncate_table("SEATS_DATA.SEATS_API_TRAINING_DATA")
+    sub_folder = "test_data_for_proc_load_seats_api_training_data"
+
+    input_tables = [
+        "SEATS_DATA.FLIGHTSUMMARY",
+        "SEATS_DATA.VIEW_SCHEDULE_INSTANCES",
+        "SEATS_DATA.EQUIPMENT_MAIN_EFFECTIVITY",
+        "SEATS_DATA.HISTORICAL_FLEET_DATA",
+        "SEATS_DATA.VIEW_CHAVIATION_CARRIER_CODES",
+    ]
+    scaled_tables["truncate"] += ["SEATS_DATA.SEATS_API_TRAINING_DATA"]
+    scaled_tables["drop"] += input_tables
+
+    for source_database, source_schema, source_table in [
+        (os.getenv("BeakerDb"), "DBO", "FLIGHTSUMMARY"),
+        (os.getenv("ReferenceDb"), "INTERFACE", "VIEW_CHAVIATION_CARRIER_CODES"),
+        (os.getenv("ReferenceDb"), "INTERFACE", "EQUIPMENT_MAIN_EFFECTIVITY"),
+        (os.getenv("ReferenceDb"), "INTERFACE", "HISTORICAL_FLEET_DATA"),
+        (os.getenv("SchedulesDb"), "INTERFACE", "VIEW_SCHEDULE_INSTANCES"),
+    ]:
+        helper.mock_interface_table(
+            source_database=source_database,
+            source_schema=source_schema,
+            source_table=source_table,
+            target_schema="SEATS_DATA",
+        )
+        helper.insert_into_table(sub_folder, f"insert_into_seats_data_{source_table.lower()}.sql")
+
+    procedure_benchmark.scale_tables(input_tables)
+
+    procedure_benchmark.measure(
+        helper.execute_procedure,
+        procedure_name="SEATS_DATA.PROC_LOAD_SEATS_API_TRAINING_DATA",
+        arguments=(*input_tables, "2022-01-03"),
+    )
+
+
+@pytest.mark.database
+@benchmark
+def test_benchmark_proc_schedules_predictions_dataset(helper, procedure_benchmark, scaled_tables):
+    sub_folder = "test_data_for_proc_schedules_predictions_dataset"
+    scaled_tables["truncate"] += ["STAGE.ACTUAL_FUEL_BURN", "STAGE.ESTIMATED_STATUS", "STAGE.ESTIMATED_SCHEDULES"]
+    scaled_tables["drop"] += ["INTERFACE.LOCATIONS_MAIN_EFFECTIVITY"]
+
+    helper.insert_into_table(sub_folder, "insert_into_stage_data_actual_fuel_burn.sql")
+    helper.mock_interface_table(
+        source_database=os.getenv("ReferenceDb"),
+        source_schema="INTERFACE",
+        source_table="LOCATIONS_MAIN_EFFECTIVITY",
+        target_schema="INTERFACE",
+    )
+    helper.insert_into_table(sub_folder, "insert_into_interface_locations_main_effectivity.sql")
+    helper.insert_into_table(sub_folder, "insert_into_stage_estimated_status.sql")
+    helper.insert_into_table(sub_folder, "insert_into_stage_estimated_schedules.sql")
+
+    procedure_benchmark.scale_tables(
+        [
+            "STAGE.ACTUAL_FUEL_BURN",
+            "INTERFACE.LOCATIONS_MAIN_EFFECTIVITY",
+            "STAGE.ESTIMATED_STATUS",
+            "STAGE.ESTIMATED_SCHEDULES",
+        ]
+    )
+
+    procedure_benchmark.measure(
+        helper.get_procedure_results,
+        procedure_name="STAGE.PROC_SCHEDULES_PREDICTIONS_DATASET",
+        arguments=(
+            "INTERFACE.LOCATIONS_MAIN_EFFECTIVITY",
+            "2023-01-01",
+            "2023-09-01",
+        ),
+    )
+
+
+@pytest.mark.database
+@benchmark
+def test_benchmark_proc_insert_schedules_outputs(helper, procedure_benchmark, scaled_tables):
+    sub_folder = "test_data_for_proc_insert_schedules_outputs"
+    scaled_tables["truncate"] += [
+        "STAGE.ESTIMATED_SCHEDULES",
+        "STAGE.SCHEDULES_ADJUSTMENTS",
+        "INTERFACE.ESTIMATED_SCHEDULES",
+    ]
+
+    helper.insert_into_table(sub_folder, "insert_into_stage_estimated_schedules.sql")
+    helper.insert_into_table(sub_folder, "insert_into_stage_schedules_adjustments.sql")
+
+    procedure_benchmark.scale_tables(["STAGE.ESTIMATED_SCHEDULES", "STAGE.SCHEDULES_ADJUSTMENTS"])
+
+    procedure_benchmark.measure(
+        helper.get_procedure_results,
+        procedure_name="INTERFACE.PROC_INSERT_SCHEDULES_OUTPUTS",
+        arguments=(2,),
+    )
+
+
+class LocalCursor:
+    def __init__(self, backend):
+        self.backend = backend
+        self.result = []
+
+    def execute(self, query, params=None):
+        self.backend.queries.append((" ".join(query.split()), params))
+        if "current_timestamp" in query:
+            self.backend.now += timedelta(seconds=1)
+            self.result = [(self.backend.now,)]
+        elif "query_history" in query:
+            self.result = self.backend.query_history
+        elif "information_schema.columns" in query:
+            columns = self.backend.columns[params["table_name"]]
+            self.result = [(column, data_type, max_length) for column, (data_type, max_length) in columns.items()]
+        elif "max(length(" in query:
+            columns = re.findall(r'length\("(\w+)"\)', query)
+            self.result = [tuple(self.backend.longest_values[column] for column in columns)]
+        return self
+
+    def fetchone(self):
+        return self.result[0]
+
+    def fetchall(self):
+        return self.result
+
+
+class LocalBackend:
+    def __init__(self, query_history):
+        self.query_history = query_history
+        self.columns = COLUMNS
+        self.longest_values = {"CARRIER": 2, "ROUTE": 7}
+        self.queries = []
+        self.now = datetime(2023, 1, 1)
+
+    def cursor(self):
+        return LocalCursor(self)
+
+
+COLUMNS = {
+    "ESTIMATED_SCHEDULES": {
+        "FLIGHT_ID": ("NUMBER", None),
+        "CARRIER": ("TEXT", 16),
+        "ROUTE": ("TEXT", 256),
+        "DEPARTURE_DATE": ("DATE", None),
+    },
+    "SCHEDULES_ADJUSTMENTS": {"FLIGHT_ID": ("NUMBER", None), "ROUTE": ("TEXT", 8), "ADJUSTMENT": ("FLOAT", None)},
+}
+QUERY_HISTORY = [
+    ("CALL", 1200, 0, 0, 0, 0),
+    ("INSERT", 700, 4096, 2, 10, 0),
+    ("SELECT", 300, 1024, 1, 10, 512),
+]
+
+
+def _measure(tmp_path, query_history, multiplier=10):
+    backend = LocalBackend(query_history)
+    procedure_benchmark = ProcedureBenchmark(backend, multiplier=multiplier, baseline_path=tmp_path / "baseline.json")
+    result = procedure_benchmark.measure(lambda procedure_name: "ok", procedure_name="STAGE.PROC")
+    return procedure_benchmark, backend, result
+
+
+def test_measure_summarises_query_profile(tmp_path):
+    procedure_benchmark, _, result = _measure(tmp_path, QUERY_HISTORY)
+
+    assert result == "ok"
+    assert procedure_benchmark.results["STAGE.PROC@x10"] == {
+        "elapsed_ms": 1200,
+        "bytes_scanned": 5120,
+        "partitions_scanned": 3,
+        "partitions_total": 20,
+        "partitions_pruned": 17,
+        "partitions_pruned_ratio": 0.85,
+        "bytes_spilled": 512,
+    }
+
+
+def test_scale_tables_copies_rows_multiplier_minus_one_times(tmp_path):
+    procedure_benchmark, backend, _ = _measure(tmp_path, QUERY_HISTORY, multiplier=5)
+    procedure_benchmark.scale_tables(["STAGE.ESTIMATED_SCHEDULES"], key_columns=["FLIGHT_ID", "CARRIER"])
+
+    query, params = backend.queries[-1]
+    assert query.startswith("insert into identifier(%(table)s)")
+    assert params["table"] == "STAGE.ESTIMATED_SCHEDULES" and params["copies"] == 4
+    assert 't."FLIGHT_ID" + g.copy * %(key_stride)s as "FLIGHT_ID"' in query
+    assert 't."CARRIER" || \'~\' || g.copy as "CARRIER"' in query
+    assert "DEPARTURE_DATE" not in query
+
+
+def test_scale_tables_offsets_columns_shared_between_tables(tmp_path):
+    procedure_benchmark, backend, _ = _measure(tmp_path, QUERY_HISTORY, multiplier=5)
+    procedure_benchmark.scale_tables(["STAGE.ESTIMATED_SCHEDULES", "STAGE.SCHEDULES_ADJUSTMENTS"])
+
+    inserts = [query for query, _ in backend.queries if query.startswith("insert")]
+    assert all('replace (t."FLIGHT_ID" + g.copy * %(key_stride)s as "FLIGHT_ID")' in query for query in inserts)
+    assert not any("CARRIER" in query for query in inserts)
+
+
+def test_text_keys_too_short_for_the_suffix_are_not_offset_anywhere(tmp_path):
+    procedure_benchmark, backend, _ = _measure(tmp_path, QUERY_HISTORY, multiplier=5)
+    procedure_benchmark.scale_tables(["STAGE.ESTIMATED_SCHEDULES", "STAGE.SCHEDULES_ADJUSTMENTS"])
+
+    inserts = [query for query, _ in backend.queries if query.startswith("insert")]
+    assert len(inserts) == 2
+    assert not any('t."ROUTE"' in query for query in inserts)
+
+
+def test_regressions_beyond_tolerance_are_reported(tmp_path):
+    baseline, _, _ = _measure(tmp_path, QUERY_HISTORY)
+    baseline.update_baseline()
+
+    slower_history = [("CALL", 1900, 0, 0, 0, 0), ("INSERT", 700, 4096, 10, 10, 0), ("SELECT", 300, 1024, 1, 10, 512)]
+    within_tolerance, _, _ = _measure(tmp_path, [("CALL", 1500, 0, 0, 0, 0), *QUERY_HISTORY[1:]])
+    regressed, _, _ = _measure(tmp_path, slower_history)
+
+    assert within_tolerance.compare_with_baseline() == []
+    assert regressed.compare_with_baseline() == [
+        "STAGE.PROC@x10 elapsed_ms: 1900 > baseline 1200",
+        "STAGE.PROC@x10 partitions_pruned_ratio: 0.45 < baseline 0.85",
+    ]
+
+
+def test_missing_baseline_is_reported(tmp_path):
+    procedure_benchmark, _, _ = _measure(tmp_path, QUERY_HISTORY)
+
+    regressions = procedure_benchmark.compare_with_baseline()
+
+    assert len(regressions) == 1 and regressions[0].startswith("STAGE.PROC@x10: no baseline")
@@ -0,0 +1,64 @@
+import pytest
+
+pytest.importorskip("paramiko")
+pytest.importorskip("pysftp")
+
+from case12 import _percentile, compare_results, generate_traffic_files  # noqa: E402
+
+
+def _results(files_per_second=10.0, mb_per_second=5.0, p50=20.0, p99=80.0, peak_traced_mb=4.0):
+    return {
+        "stages": {
+            "copy": {
+                "files_per_second": files_per_second,
+                "mb_per_second": mb_per_second,
+                "peak_traced_mb": peak_traced_mb,
+                "latency_ms": {"p50": p50, "p99": p99},
+            }
+        }
+    }
+
+
+def test_percentile_uses_nearest_rank():
+    values = [5.0, 1.0, 4.0, 2.0, 3.0]
+
+    assert _percentile(values, 50) == 3.0
+    assert _percentile(values, 90) == 5.0
+    assert _percentile(values, 99) == 5.0
+    assert _percentile(values, 1) == 1.0
+
+
+def test_percentile_of_single_value():
+    assert _percentile([7.0], 50) == 7.0
+    assert _percentile([7.0], 99) == 7.0
+
+
+def test_results_within_tolerance_do_not_regress():
+    current = _results(files_per_second=9.0, mb_per_second=4.5, p50=23.0, p99=90.0, peak_traced_mb=4.5)
+
+    assert compare_results(_results(), current, tolerance=0.2) == []
+
+
+def test_slower_throughput_latency_and_memory_regress():
+    current = _results(files_per_second=7.0, mb_per_second=3.0, p50=30.0, p99=80.0, peak_traced_mb=6.0)
+
+    regressions = compare_results(_results(), current, tolerance=0.2)
+
+    assert [regression.split(":")[0] for regression in regressions] == [
+        "copy.files_per_second",
+        "copy.mb_per_second",
+        "copy.latency_ms.p50",
+        "copy.peak_traced_mb",
+    ]
+
+
+def test_stages_missing_from_current_run_regress():
+    assert compare_results(_results(), {"stages": {}}, tolerance=0.2) == ["copy: missing from the current run"]
+
+
+def test_generated_files_have_the_requested_compressed_size(tmp_path):
+    size_bytes = 256 * 1024
+
+    files = generate_traffic_files(tmp_path, 2, size_bytes)
+
+    assert all(size_bytes <= path.stat().st_size < size_bytes * 1.2 for path in files)
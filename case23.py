@@ -0,0 +1,46 @@
+from case15 import IMPORTTIME_LINE, check_budgets, parse_importtime, top_imports
+
+IMPORTTIME_OUTPUT = """import time: self [us] | cumulative | imported package
+import time:       120 |        120 |   _io
+import time:        80 |        200 | io
+import time:       300 |        300 |     pandas._libs
+import time:      1500 |       1800 |   pandas
+import time:        50 |         50 |   json
+import time:       400 |       2450 | case7"""
+
+
+def _measurement(output: str) -> dict:
+    imports = parse_importtime(output)
+    return {"cumulative_us": imports["case7"]["cumulative_us"], "imports": imports}
+
+
+def test_importtime_line_parses_timings_and_depth():
+    match = IMPORTTIME_LINE.match("import time:       300 |        300 |     pandas._libs")
+
+    assert match.groups() == ("300", "300", "     ", "pandas._libs")
+    assert IMPORTTIME_LINE.match("import time: self [us] | cumulative | imported package") is None
+
+
+def test_parse_importtime_skips_header_and_records_depth():
+    imports = parse_importtime(IMPORTTIME_OUTPUT)
+
+    assert list(imports) == ["_io", "io", "pandas._libs", "pandas", "json", "case7"]
+    assert imports["pandas._libs"] == {"self_us": 300, "cumulative_us": 300, "depth": 2}
+    assert imports["case7"]["depth"] == 0
+
+
+def test_top_imports_ranks_direct_imports_only():
+    measurement = _measurement(IMPORTTIME_OUTPUT)
+
+    assert top_imports(measurement) == [("pandas", 1800), ("_io", 120), ("json", 50)]
+    assert top_imports(measurement, count=1) == [("pandas", 1800)]
+
+
+def test_check_budgets_flags_modules_over_tolerance():
+    results = {"case7": 130_000, "case8": 110_000, "new_module": 500_000}
+    budgets = {"case7": 100_000, "case8": 100_000}
+
+    assert check_budgets(results, budgets, tolerance=0.2) == [
+        "case7: 130.0 ms > budget 100.0 ms",
+        "new_module: no budget, run with --update to record one",
+    ]
@@ -0,0 +1,210 @@
+import json
+import pytest
+import sys
+
+from types import ModuleType
+
+pytest.importorskip("pandas")
+
+import case7  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def host_modules(monkeypatch):
+    # utils and split_locations_data are provided by the Function host, not by this repository
+    utils = ModuleType("utils")
+    utils.logging_decorator_factory = lambda load_id, load_name, step_name=None: lambda func: func
+    utils.call_api = lambda url, params, session: None
+    split_locations_data = ModuleType("split_locations_data")
+    split_locations_data.LOAD_ID = 0
+    monkeypatch.setitem(sys.modules, "utils", utils)
+    monkeypatch.setitem(sys.modules, "split_locations_data", split_locations_data)
+
+
+class FakeDownload:
+    def __init__(self, blocks: list[bytes]):
+        self.blocks = blocks
+
+    def chunks(self):
+        return iter(self.blocks)
+
+
+class FakeQueueMessage:
+    def __init__(self, payload: dict, message_id: str = "msg-1"):
+        self.id = message_id
+        self.body = json.dumps(payload).encode()
+
+    def get_body(self):
+        return self.body
+
+
+def _ndjson(count: int) -> bytes:
+    return b"".join(
+        json.dumps({"PK": i, "COUNTRY_CODE": "TR", "LOCATION": f"Hotel {i}"}).encode() + b"\n" for i in range(count)
+    )
+
+
+@pytest.fixture
+def blob(monkeypatch):
+    blocks = []
+    monkeypatch.setattr(case7, "_download_blob", lambda blob_url: FakeDownload(blocks))
+    return blocks
+
+
+def _chunk_pks(chunk_rows: int) -> list[list[int]]:
+    return [list(chunk.PK) for chunk in case7._iter_ndjson_chunks("https://blob", chunk_rows)]
+
+
+def test_lines_spanning_blocks_are_joined(blob):
+    data = _ndjson(3)
+    blob.extend([data[:10], data[10:45], data[45:]])
+
+    assert _chunk_pks(10) == [[0, 1, 2]]
+
+
+def test_trailing_line_without_newline_is_read(blob):
+    blob.append(_ndjson(2) + json.dumps({"PK": 2, "LOCATION": "Hotel 2"}).encode())
+
+    assert _chunk_pks(10) == [[0, 1, 2]]
+
+
+def test_blank_lines_are_skipped(blob):
+    data = _ndjson(2)
+    blob.append(b"\n" + data.replace(b"\n", b"\n\n", 1) + b"  \n")
+
+    assert _chunk_pks(10) == [[0, 1]]
+
+
+def test_chunks_are_cut_at_chunk_rows(blob):
+    blob.append(_ndjson(4))
+
+    assert _chunk_pks(2) == [[0, 1], [2, 3]]
+    assert _chunk_pks(4) == [[0, 1, 2, 3]]
+    assert _chunk_pks(3) == [[0, 1, 2], [3]]
+
+
+def test_chunk_rows_boundary_on_trailing_line(blob):
+    blob.append(_ndjson(3).rstrip(b"\n"))
+
+    assert _chunk_pks(3) == [[0, 1, 2]]
+
+
+def test_claim_check_chunks_get_missing_coordinate_columns(blob, monkeypatch):
+    monkeypatch.setattr(case7, "get_settings", lambda: case7.Settings("key", "db", 2, "https://acc/container", "sas"))
+    blob.append(_ndjson(3))
+    msg = FakeQueueMessage({"claim_check": {"blob_url": "https://acc/container/locations.ndjson"}})
+
+    chunks = list(case7.iter_location_chunks(msg))
+
+    assert [len(chunk) for chunk in chunks] == [2, 1]
+    assert set(case7.LOCATION_INPUT_COLUMNS) <= set(chunks[0].columns)
+    assert chunks[0].LATITUDE_DD.isna().all()
+
+
+def test_inline_message_yields_a_single_chunk():
+    msg = FakeQueueMessage({"data": {"PK": [1, 2], "LOCATION": ["a", "b"]}})
+
+    chunks = list(case7.iter_location_chunks(msg))
+
+    assert len(chunks) == 1 and list(chunks[0].PK) == [1, 2]
+
+
+def test_process_message_dispatches_on_claim_check(monkeypatch):
+    calls = []
+    monkeypatch.setattr(case7, "process_claim_check_message", lambda msg, session, con: calls.append("claim_check"))
+    monkeypatch.setattr(case7, "process_queue_message", lambda msg: calls.append("inline") or (None, None, ""))
+    monkeypatch.setattr(case7, "_enrich_and_write_locations", lambda *args: None)
+
+    case7.process_message(FakeQueueMessage({"claim_check": {"blob_url": "https://acc/c/x"}}), None, None)
+    case7.process_message(FakeQueueMessage({"data": {}}), None, None)
+
+    assert calls == ["claim_check", "inline"]
+
+
+def test_download_rejects_blobs_outside_the_configured_container(monkeypatch):
+    monkeypatch.setattr(case7, "get_settings", lambda: case7.Settings("key", "db", 2, "https://acc/container", "sas"))
+
+    with pytest.raises(ValueError, match="outside"):
+        case7._download_blob("https://attacker/container/locations.ndjson")
+    with pytest.raises(ValueError, match="outside"):
+        case7._download_blob("https://acc/other/locations.ndjson")
+    with pytest.raises(ValueError, match="outside"):
+        case7._download_blob("https://acc/container/../other/locations.ndjson")
+
+
+def test_expired_snowflake_token_retries_the_message(monkeypatch):
+    from case16 import ResourceManager
+
+    class ExpiredTokenError(Exception):
+        errno = 390114
+
+    class FakeResource:
+        def is_closed(self):
+            return False
+
+        def close(self):
+            pass
+
+    connections = []
+
+    def process_message(msg, session, con):
+        connections.append(con)
+        if len(connections) == 1:
+            raise ExpiredTokenError("Authentication token has expired")
+
+    manager = ResourceManager(snowflake_factory=FakeResource, session_factory=FakeResource)
+    monkeypatch.setattr(case7, "get_resource_manager", lambda: manager)
+    monkeypatch.setattr(case7, "process_message", process_message)
+
+    case7.handle_queue_message(FakeQueueMessage({"data": {}}))
+
+    assert len(connections) == 2 and connections[0] is not connections[1]
+    assert manager.metrics["snowflake_reconnects"] == 1
+
+
+class ChunkProgressCursor:
+    def __init__(self, connection):
+        self.connection = connection
+        self.rows = []
+
+    def execute(self, query, params=None):
+        if query.strip().startswith("select chunk_index"):
+            completed = self.connection.completed
+            self.rows = [(chunk_index,) for message_id, chunk_index in completed if message_id == params["message_id"]]
+        elif query.strip().startswith("insert"):
+            self.connection.completed.append((params["message_id"], params["chunk_index"]))
+        return self
+
+    def fetchall(self):
+        return self.rows
+
+
+class ChunkProgressConnection:
+    def __init__(self):
+        self.completed = []
+
+    def cursor(self):
+        return ChunkProgressCursor(self)
+
+
+def test_retried_claim_check_message_skips_written_chunks(blob, monkeypatch):
+    monkeypatch.setattr(case7, "get_settings", lambda: case7.Settings("key", "db", 2, "https://acc/container", "sas"))
+    blob.append(_ndjson(5))
+    written = []
+    failures = [ConnectionError("Snowflake went away")]
+
+    def write(df_coordinate, df_location, session, con):
+        written.append(list(df_location.PK))
+        if written[-1] == [2, 3] and failures:
+            raise failures.pop()
+
+    monkeypatch.setattr(case7, "_enrich_and_write_locations", write)
+    con = ChunkProgressConnection()
+    msg = FakeQueueMessage({"claim_check": {"blob_url": "https://acc/container/locations.ndjson"}})
+
+    with pytest.raises(ConnectionError):
+        case7.process_claim_check_message(msg, None, con)
+    case7.process_claim_check_message(msg, None, con)
+
+    assert written == [[0, 1], [2, 3], [2, 3], [4]]
+    assert con.completed == [("msg-1", 0), ("msg-1", 1), ("msg-1", 2)]
@@ -0,0 +1,14 @@
+from behave import then
+
+
+@then("the loaded traffic data meets the data quality expectations")
+def step_traffic_data_meets_expectations(context):
+    results = context.validate_traffic_data(context.snowflake_connection)
+
+    failures = [
+        f"{table}: {result['expectation']}({result['column']}) observed {result['observed_value']}"
+        for table, table_results in results.items()
+        for result in table_results
+        if not result["success"]
+    ]
+    assert not failures, "Data quality expectations failed:\n" + "\n".join(failures)
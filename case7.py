@@ -1,17 +1,22 @@
+from __future__ import annotations
+
 import os
-import pandas as pd
 import json
-import azure.functions as func
+import tempfile
 
-from typing import NamedTuple
-from requests import Session, Response
+from functools import lru_cache, wraps
+from typing import Callable, Iterator, NamedTuple, TYPE_CHECKING
 from pathlib import Path
-from snowflake.connector.pandas_tools import write_pandas
-from snowflake.connector import SnowflakeConnection
 from datetime import datetime
-from dateutil.relativedelta import relativedelta
-from utils import logging_decorator_factory, call_api
-from split_locations_data import LOAD_ID
+from urllib.parse import urlsplit
+from case13 import instrumented_step, http_call_timer, message_trace
+from case16 import get_resource_manager
+
+if TYPE_CHECKING:
+    import pandas as pd
+    import azure.functions as func
+    from requests import Session, Response
+    from snowflake.connector import SnowflakeConnection
 
 BASE_PATH = Path(__file__).parent
 LOAD_NAME = "GET_DATA_FROM_AZURE_MAPS_API"
@@ -29,29 +34,122 @@ OUTPUT_DATA_COLUMNS = [
     "SCORE",
     "TIMEZONE_DETAILS",
 ]
+LOCATION_INPUT_COLUMNS = ["PK", "COUNTRY_CODE", "LOCATION", "LATITUDE_DD", "LONGITUDE_DD", "COORDINATE_SOURCE"]
+PARQUET_SPOOL_MAX_BYTES = 64 * 1024 * 1024
+CLAIM_CHECK_CHUNKS_TABLE = "STAGE.AZURE_MAPS_CLAIM_CHECK_CHUNKS"
+
+
+class Settings(NamedTuple):
+    azure_maps_subscription_key: str
+    reference_db: str
+    locations_chunk_rows: int
+    locations_container_url: str
+    locations_storage_account_sas_token: str
+
+
+def _logged_step(step_name: str) -> Callable:
+    # utils and split_locations_data are only imported on the first call, LOAD_ID is not needed to load the module
+    def decorator(func: Callable) -> Callable:
+        logged = None
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            nonlocal logged
+            if logged is None:
+                from utils import logging_decorator_factory
+                from split_locations_data import LOAD_ID
+
+                logged = logging_decorator_factory(LOAD_ID, LOAD_NAME, step_name=step_name)(func)
+            return logged(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+@lru_cache(maxsize=None)
+def get_settings() -> Settings:
+    return Settings(
+        azure_maps_subscription_key=os.getenv("AzureMapsSubscriptionKey"),
+        reference_db=os.getenv("ReferenceDb"),
+        locations_chunk_rows=int(os.getenv("LocationsChunkRows", "5000")),
+        locations_container_url=os.getenv("LocationsContainerUrl"),
+        locations_storage_account_sas_token=os.getenv("LocationsStorageAccountSasToken"),
+    )
+
+
+def handle_queue_message(msg: func.QueueMessage) -> None:
+    # Entry point for the queue trigger: the Snowflake connection and HTTP session are shared across invocations
+    # run_on_snowflake reconnects and runs the message again when the Snowflake token has expired
+    resources = get_resource_manager()
+    with resources.http_session() as session:
+        resources.run_on_snowflake(lambda con: process_message(msg, session, con))
+    resources.emit_metrics()
+
+
+def process_message(msg: func.QueueMessage, session: Session, con: SnowflakeConnection) -> None:
+    if _is_claim_check(msg):
+        process_claim_check_message(msg, session, con)
+        return
+    with message_trace("Storage Queue message", message_id=msg.id):
+        df_coordinate, df_location, _ = process_queue_message(msg)
+        _enrich_and_write_locations(df_coordinate, df_location, session, con)
 
 
-@logging_decorator_factory(LOAD_ID, LOAD_NAME, step_name="Processing Storage Queue message")
+def process_claim_check_message(msg: func.QueueMessage, session: Session, con: SnowflakeConnection) -> None:
+    # Chunks are written one by one, a retried message skips the chunks a previous attempt already wrote
+    with message_trace("Storage Queue message", message_id=msg.id):
+        completed_chunks = _completed_chunks(con, msg.id)
+        for chunk_index, df_chunk in enumerate(iter_location_chunks(msg)):
+            if chunk_index in completed_chunks:
+                continue
+            df_coordinate, df_location, _ = process_location_chunk(df_chunk)
+            _enrich_and_write_locations(df_coordinate, df_location, session, con)
+            _mark_chunk_completed(con, msg.id, chunk_index)
+
+
+@_logged_step("Processing Storage Queue message")
+@instrumented_step("Processing Storage Queue message")
 def process_queue_message(msg: func.QueueMessage) -> tuple[pd.DataFrame, pd.DataFrame, str]:
+    import pandas as pd
+
     message_payload = json.loads(msg.get_body().decode())
+    if "claim_check" in message_payload:
+        raise ValueError(f"Message {msg.id} is a claim check, process it with process_claim_check_message")
     df_data = pd.DataFrame.from_dict(message_payload.get("data"), orient="columns")
-    _locations_logic_filter = df_data.LATITUDE_DD.isna() & df_data.LONGITUDE_DD.isna() & ~df_data.LOCATION.isna()
-    df_location = df_data[_locations_logic_filter].copy()
-    df_tmp = df_data[~_locations_logic_filter]
-    df_coordinate = df_tmp[(~df_tmp.LATITUDE_DD.isna() & ~df_tmp.LONGITUDE_DD.isna())].copy()
-    additional_info = json.dumps(
-        {
-            "PROCEDURE_OUTPUT_DATA": len(df_coordinate) + len(df_location),
-            "COUNT_WITH_COORDINATES": len(df_coordinate),
-            "COUNT_WITHOUT_COORDINATES": len(df_location),
-            "COUNT_DISCARDED": len(df_tmp) - len(df_coordinate),
-        }
-    )
-    return df_coordinate, df_location, additional_info
+    return _split_locations(_with_location_columns(df_data))
 
 
-@logging_decorator_factory(LOAD_ID, LOAD_NAME, "Calling Azure Maps API for coordinates")
+def iter_location_chunks(msg: func.QueueMessage) -> Iterator[pd.DataFrame]:
+    import pandas as pd
+
+    message_payload = json.loads(msg.get_body().decode())
+    claim_check = message_payload.get("claim_check")
+    if claim_check is None:
+        yield _with_location_columns(pd.DataFrame.from_dict(message_payload.get("data"), orient="columns"))
+        return
+
+    chunk_rows = get_settings().locations_chunk_rows
+    if claim_check.get("format", "ndjson") == "parquet":
+        chunks = _iter_parquet_chunks(claim_check["blob_url"], chunk_rows)
+    else:
+        chunks = _iter_ndjson_chunks(claim_check["blob_url"], chunk_rows)
+    for df_chunk in chunks:
+        yield _with_location_columns(df_chunk)
+
+
+@_logged_step("Processing location payload chunk")
+@instrumented_step("Processing location payload chunk")
+def process_location_chunk(df_data: pd.DataFrame) -> tuple[pd.DataFrame, pd.DataFrame, str]:
+    return _split_locations(df_data)
+
+
+@_logged_step("Calling Azure Maps API for coordinates")
+@instrumented_step("Calling Azure Maps API for coordinates")
 def get_coordinates(df_loc: pd.DataFrame, session: Session) -> tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame, str]:
+    import pandas as pd
+    from utils import call_api
+
     ldf = pd.DataFrame(
         columns=[
             "PK",
@@ -70,12 +168,13 @@ def get_coordinates(df_loc: pd.DataFrame, session: Session) -> tuple[pd.DataFram
         params = {
             "api-version": "1.0",
             "query": row.LOCATION,
-            "subscription-key": os.getenv("AzureMapsSubscriptionKey"),
+            "subscription-key": get_settings().azure_maps_subscription_key,
             "countrySet": row.COUNTRY_CODE,
             "CategorySet": CATEGORY_SET,
             "idxSet": "POI",
         }
-        http_output = call_api(url, params, session)
+        with http_call_timer(FUZZY_ENDPOINT):
+            http_output = call_api(url, params, session)
         ldf, missing_results, failed_response = _process_coordinates(
             http_output, ldf, missing_results, failed_response, row
         )
@@ -92,8 +191,13 @@ def get_coordinates(df_loc: pd.DataFrame, session: Session) -> tuple[pd.DataFram
     return ldf, missing_results, failed_response, additional_info
 
 
-@logging_decorator_factory(LOAD_ID, LOAD_NAME, step_name="Calling Azure Maps API for timezones")
+@_logged_step("Calling Azure Maps API for timezones")
+@instrumented_step("Calling Azure Maps API for timezones")
 def get_timezones(df_coord: pd.DataFrame, session: Session) -> tuple[pd.DataFrame, str]:
+    import pandas as pd
+    from dateutil.relativedelta import relativedelta
+    from utils import call_api
+
     rdf = pd.DataFrame(columns=OUTPUT_DATA_COLUMNS)
     url = f"{BASE_URL}{TIMEZONES_ENDPOINT}"
     current_day = datetime.now().replace(month=1, day=1, hour=0, second=0, minute=0, microsecond=0)
@@ -102,19 +206,23 @@ def get_timezones(df_coord: pd.DataFrame, session: Session) -> tuple[pd.DataFram
         params = {
             "api-version": "1.0",
             "query": f"{row.LATITUDE_DD},{row.LONGITUDE_DD}",
-            "subscription-key": os.getenv("AzureMapsSubscriptionKey"),
+            "subscription-key": get_settings().azure_maps_subscription_key,
             "options": "all",
             "transitionsFrom": f"{transition_from}Z",
             "transitionsYears": "10",
         }
-        http_output = call_api(url, params, session)
+        with http_call_timer(TIMEZONES_ENDPOINT):
+            http_output = call_api(url, params, session)
         rdf = _process_timezones(http_output, rdf, row)
     additional_info = json.dumps({"PROCEDURE_OUTPUT_DATA": len(rdf.index)})
     return rdf, additional_info
 
 
-@logging_decorator_factory(LOAD_ID, LOAD_NAME, step_name="Writing Data to Snowflake")
+@_logged_step("Writing Data to Snowflake")
+@instrumented_step("Writing Data to Snowflake")
 def write_timezones_to_snowflake(con: SnowflakeConnection, output: pd.DataFrame) -> tuple[None, str]:
+    from snowflake.connector.pandas_tools import write_pandas
+
     con.cursor().execute("USE SCHEMA STAGE;")
     n_rows = 0
     if len(output) > 0:
@@ -122,13 +230,130 @@ def write_timezones_to_snowflake(con: SnowflakeConnection, output: pd.DataFrame)
             con,
             output,
             table_name="AZURE_MAPS_TIMEZONES_BY_COORDINATES",
-            database=os.getenv("ReferenceDb"),
+            database=get_settings().reference_db,
             schema="STAGE",
         )
     additional_info = json.dumps({"PROCEDURE_OUTPUT_DATA": n_rows})
     return None, additional_info
 
 
+def _enrich_and_write_locations(
+    df_coordinate: pd.DataFrame, df_location: pd.DataFrame, session: Session, con: SnowflakeConnection
+):
+    import pandas as pd
+
+    df_located, missing_results, failed_response, _ = get_coordinates(df_location, session)
+    df_timezones, _ = get_timezones(pd.concat([df_coordinate, df_located], ignore_index=True), session)
+    output = pd.concat([df_timezones, missing_results, failed_response], ignore_index=True)
+    write_timezones_to_snowflake(con, output[OUTPUT_DATA_COLUMNS])
+
+
+def _is_claim_check(msg: func.QueueMessage) -> bool:
+    return "claim_check" in json.loads(msg.get_body().decode())
+
+
+def _completed_chunks(con: SnowflakeConnection, message_id: str) -> set[int]:
+    con.cursor().execute(
+        f"""
+        create table if not exists {CLAIM_CHECK_CHUNKS_TABLE} (
+            message_id varchar
+          , chunk_index number
+          , completed_at timestamp_ntz
+        )
+        """
+    )
+    rows = (
+        con.cursor()
+        .execute(
+            f"select chunk_index from {CLAIM_CHECK_CHUNKS_TABLE} where message_id = %(message_id)s",
+            {"message_id": message_id},
+        )
+        .fetchall()
+    )
+    return {row[0] for row in rows}
+
+
+def _mark_chunk_completed(con: SnowflakeConnection, message_id: str, chunk_index: int):
+    con.cursor().execute(
+        f"""
+        insert into {CLAIM_CHECK_CHUNKS_TABLE} (message_id, chunk_index, completed_at)
+        select %(message_id)s, %(chunk_index)s, current_timestamp()
+        """,
+        {"message_id": message_id, "chunk_index": chunk_index},
+    )
+
+
+def _with_location_columns(df_data: pd.DataFrame) -> pd.DataFrame:
+    # NDJSON writers drop null fields, so a chunk can miss e.g. LATITUDE_DD/LONGITUDE_DD entirely
+    missing_columns = [column for column in LOCATION_INPUT_COLUMNS if column not in df_data.columns]
+    return df_data.reindex(columns=[*df_data.columns, *missing_columns])
+
+
+def _split_locations(df_data: pd.DataFrame) -> tuple[pd.DataFrame, pd.DataFrame, str]:
+    _locations_logic_filter = df_data.LATITUDE_DD.isna() & df_data.LONGITUDE_DD.isna() & ~df_data.LOCATION.isna()
+    df_location = df_data[_locations_logic_filter].copy()
+    df_tmp = df_data[~_locations_logic_filter]
+    df_coordinate = df_tmp[(~df_tmp.LATITUDE_DD.isna() & ~df_tmp.LONGITUDE_DD.isna())].copy()
+    additional_info = json.dumps(
+        {
+            "PROCEDURE_OUTPUT_DATA": len(df_coordinate) + len(df_location),
+            "COUNT_WITH_COORDINATES": len(df_coordinate),
+            "COUNT_WITHOUT_COORDINATES": len(df_location),
+            "COUNT_DISCARDED": len(df_tmp) - len(df_coordinate),
+        }
+    )
+    return df_coordinate, df_location, additional_info
+
+
+def _download_blob(blob_url: str):
+    # Claim checks may only point into the configured container; access uses the SAS token from the settings
+    settings = get_settings()
+    if not settings.locations_container_url or not settings.locations_storage_account_sas_token:
+        raise ValueError("LocationsContainerUrl and LocationsStorageAccountSasToken must be set for claim checks")
+    container = urlsplit(settings.locations_container_url)
+    blob = urlsplit(blob_url)
+    container_path = container.path.rstrip("/") + "/"
+    in_container = blob.path.startswith(container_path) and ".." not in blob.path.split("/")
+    if (blob.scheme, blob.netloc) != ("https", container.netloc) or not in_container:
+        raise ValueError(f"Claim check blob {blob.netloc}{blob.path} is outside {settings.locations_container_url}")
+
+    from azure.storage.blob import BlobClient
+
+    blob_client = BlobClient.from_blob_url(
+        f"https://{blob.netloc}{blob.path}", credential=settings.locations_storage_account_sas_token
+    )
+    return blob_client.download_blob()
+
+
+def _iter_ndjson_chunks(blob_url: str, chunk_rows: int) -> Iterator[pd.DataFrame]:
+    import pandas as pd
+
+    rows = []
+    remainder = b""
+    for block in _download_blob(blob_url).chunks():
+        *lines, remainder = (remainder + block).split(b"\n")
+        for line in lines:
+            if line.strip():
+                rows.append(json.loads(line))
+            if len(rows) >= chunk_rows:
+                yield pd.DataFrame.from_records(rows)
+                rows = []
+    if remainder.strip():
+        rows.append(json.loads(remainder))
+    if rows:
+        yield pd.DataFrame.from_records(rows)
+
+
+def _iter_parquet_chunks(blob_url: str, chunk_rows: int) -> Iterator[pd.DataFrame]:
+    import pyarrow.parquet as pq
+
+    with tempfile.SpooledTemporaryFile(max_size=PARQUET_SPOOL_MAX_BYTES) as spool:
+        _download_blob(blob_url).readinto(spool)
+        spool.seek(0)
+        for batch in pq.ParquetFile(spool).iter_batches(batch_size=chunk_rows):
+            yield batch.to_pandas()
+
+
 def _process_coordinates(
     http_output: Response,
     data_frame: pd.DataFrame,
@@ -232,6 +457,8 @@ def _process_timezones(http_output: Response, data_frame: pd.DataFrame, data_row
 
 
 def _prepare_dataframe(data_frame: pd.DataFrame, data_list: list, data_columns: list):
+    import pandas as pd
+
     rdf = pd.concat(
         [
             data_frame,
@@ -1,31 +1,58 @@
+from __future__ import annotations
+
 import os
-import pysftp
 import re
-from azure.storage.blob import BlobServiceClient
-from furl import furl
-from paramiko.sftp_file import SFTPFile
-from azure.storage.blob import ContainerClient
-
-SFTP_URL = os.getenv("SFTP_URL")
-SFTP_TRAFFIC_USERNAME = os.getenv("SFTP_TRAFFIC_USERNAME")
-SFTP_TRAFFIC_PASSWORD = os.getenv("SFTP_TRAFFIC_PASSWORD")
-TRAFFICDATA_STORAGE_ACCOUNT_SAS_TOKEN = os.getenv("TRAFFICDATA_STORAGE_ACCOUNT_SAS_TOKEN")
-TRAFFICDATA_CONTAINER_URL = os.getenv("TRAFFICDATA_CONTAINER_URL")
+
+from functools import lru_cache
+from typing import NamedTuple, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from paramiko.sftp_file import SFTPFile
+    from azure.storage.blob import ContainerClient
+
+
+class Settings(NamedTuple):
+    sftp_url: str
+    sftp_traffic_username: str
+    sftp_traffic_password: str
+    trafficdata_storage_account_sas_token: str
+    trafficdata_container_url: str
+
+
+@lru_cache(maxsize=None)
+def get_settings() -> Settings:
+    return Settings(
+        sftp_url=os.getenv("SFTP_URL"),
+        sftp_traffic_username=os.getenv("SFTP_TRAFFIC_USERNAME"),
+        sftp_traffic_password=os.getenv("SFTP_TRAFFIC_PASSWORD"),
+        trafficdata_storage_account_sas_token=os.getenv("TRAFFICDATA_STORAGE_ACCOUNT_SAS_TOKEN"),
+        trafficdata_container_url=os.getenv("TRAFFICDATA_CONTAINER_URL"),
+    )
+
+
 patternstoload = re.compile(
     r"(\d{6}_ILLUM_CONCAT_VIABK_(FINAL|PRELIM)_SURFACE.txt.gz)|(\d{6}_UNADJ_ITIN_(CUR|ADV).txt.gz)"
 )
 
 
 class SftpReader:
-    def __init__(self):
-        self.sftp_connection = None
-        self.create_sftp_connection()
+    def __init__(self, sftp_connection=None):
+        self.sftp_connection = sftp_connection
+        if self.sftp_connection is None:
+            self.create_sftp_connection()
 
     def create_sftp_connection(self):
+        import pysftp
+
+        settings = get_settings()
         cnopts = pysftp.CnOpts()
         cnopts.hostkeys = None
         self.sftp_connection = pysftp.Connection(
-            host=SFTP_URL, port=22, username=SFTP_TRAFFIC_USERNAME, password=SFTP_TRAFFIC_PASSWORD, cnopts=cnopts
+            host=settings.sftp_url,
+            port=22,
+            username=settings.sftp_traffic_username,
+            password=settings.sftp_traffic_password,
+            cnopts=cnopts,
         )
 
     def read_sftp_file(self, filename) -> SFTPFile:
@@ -33,32 +60,51 @@ class SftpReader:
 
 
 class BlobUploader:
+    def __init__(self, container_client: ContainerClient = None):
+        self.container_client = container_client
+
     @staticmethod
     def create_blob_storage_container_client() -> ContainerClient:
-        container_url = furl(TRAFFICDATA_CONTAINER_URL)
+        from azure.storage.blob import BlobServiceClient
+        from furl import furl
+
+        settings = get_settings()
+        container_url = furl(settings.trafficdata_container_url)
         container_name = container_url.path.segments[0]
 
-        blob_service_client = BlobServiceClient(container_url.origin, credential=TRAFFICDATA_STORAGE_ACCOUNT_SAS_TOKEN)
+        blob_service_client = BlobServiceClient(
+            container_url.origin, credential=settings.trafficdata_storage_account_sas_token
+        )
         return blob_service_client.get_container_client(container=container_name)
 
     def upload_file_to_blob(self, filename, data):
-        container = self.create_blob_storage_container_client()
-        container.upload_blob(filename, data=data, overwrite=True)
+        if self.container_client is None:
+            self.container_client = self.create_blob_storage_container_client()
+        self.container_client.upload_blob(filename, data=data, overwrite=True)
 
 
-def main():
-    sftp = SftpReader()
-    files_to_copy = sftp.sftp_connection.listdir_attr(".")
-    blob = BlobUploader()
-    for file in files_to_copy:
-        filename = file.filename
-        if not patternstoload.match(filename):
+def list_files_to_copy(sftp: SftpReader) -> list[str]:
+    files_to_copy = []
+    for file in sftp.sftp_connection.listdir_attr("."):
+        if not patternstoload.match(file.filename):
             continue
         if not file.st_size > 0:
             continue
-        data = sftp.read_sftp_file(filename)
+        files_to_copy.append(file.filename)
+    return files_to_copy
+
+
+def copy_file(sftp: SftpReader, blob: BlobUploader, filename: str):
+    with sftp.read_sftp_file(filename) as data:
         blob.upload_file_to_blob(filename, data)
 
 
+def main():
+    sftp = SftpReader()
+    blob = BlobUploader()
+    for filename in list_files_to_copy(sftp):
+        copy_file(sftp, blob, filename)
+
+
 if __name__ == "__main__":
     main()  # pragma: no cover
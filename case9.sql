@@ -0,0 +1,129 @@
+{{
+    config(
+        materialized='incremental',
+        unique_key='route_key',
+        tags=['adjusted', 'route']
+    )
+}}
+
+with loaded_itineraries as (
+
+    select
+        org
+      , dst
+      , cnx1
+      , cnx2
+      , cnx1a
+      , cnx2a
+      , stp1
+      , stp2
+      , stp3
+      , load_timestamp
+    from {{ ref('adjusted_final') }}
+    {% if is_incremental() %}
+    where load_timestamp > (select max(source_load_timestamp) from {{ this }})
+    {% endif %}
+
+    union all
+
+    select
+        org
+      , dst
+      , cnx1
+      , cnx2
+      , cnx1a
+      , cnx2a
+      , stp1
+      , stp2
+      , stp3
+      , load_timestamp
+    from {{ ref('adjusted_preliminary') }}
+    {% if is_incremental() %}
+    where load_timestamp > (select max(source_load_timestamp) from {{ this }})
+    {% endif %}
+
+), itineraries as (
+
+    select
+        org
+      , dst
+      , cnx1
+      , cnx2
+      , cnx1a
+      , cnx2a
+      , stp1
+      , stp2
+      , stp3
+      , max(load_timestamp) as source_load_timestamp
+    from loaded_itineraries
+    group by org, dst, cnx1, cnx2, cnx1a, cnx2a, stp1, stp2, stp3
+
+), hashed as (
+
+    select
+        md5(
+            concat_ws(
+                '/'
+              , coalesce(org, 'null')
+              , coalesce(dst, 'null')
+              , coalesce(cnx1, 'null')
+              , coalesce(cnx2, 'null')
+              , coalesce(cnx1a, 'null')
+              , coalesce(cnx2a, 'null')
+              , coalesce(stp1, 'null')
+              , coalesce(stp2, 'null')
+              , coalesce(stp3, 'null')
+            )
+        ) as route_hash
+      , *
+    from itineraries
+
+), keyed_itineraries as (
+
+    -- itineraries that already have a key are re-emitted so that the merge moves their
+    -- source_load_timestamp forward and the watermark advances on every load
+    select
+        hashed.*
+    {% if is_incremental() %}
+      , existing.route_key as existing_route_key
+    from hashed
+    left join {{ this }} as existing
+        on existing.route_hash = hashed.route_hash
+    {% else %}
+      , null as existing_route_key
+    from hashed
+    {% endif %}
+
+)
+
+select
+    coalesce(
+        existing_route_key
+      , {% if is_incremental() %}(select coalesce(max(route_key), 0) from {{ this }}) + {% endif %}row_number() over (
+            partition by existing_route_key is null
+            order by route_hash
+        )
+    ) as route_key
+  , route_hash
+  , org as scheduled_departure_airport_iata
+  , dst as scheduled_arrival_airport_iata
+  , cnx1 as connecting_airport_1
+  , cnx2 as connecting_airport_2
+  , cnx1a as connecting_airport_1_a
+  , cnx2a as connecting_airport_2_a
+  , nullif(substr(stp1, 1, 3), '') as stopping_airport_1_leg_1
+  , nullif(substr(stp1, 4, 3), '') as stopping_airport_2_leg_1
+  , nullif(substr(stp1, 7, 3), '') as stopping_airport_3_leg_1
+  , nullif(substr(stp2, 1, 3), '') as stopping_airport_1_leg_2
+  , nullif(substr(stp2, 4, 3), '') as stopping_airport_2_leg_2
+  , nullif(substr(stp2, 7, 3), '') as stopping_airport_3_leg_2
+  , nullif(substr(stp3, 1, 3), '') as stopping_airport_1_leg_3
+  , nullif(substr(stp3, 4, 3), '') as stopping_airport_2_leg_3
+  , nullif(substr(stp3, 7, 3), '') as stopping_airport_3_leg_3
+  , case
+        when cnx1 is null and cnx1a is null and cnx2 is null and cnx2a is null then 1
+        when cnx1 is not null and cnx1a is not null and cnx2 is null and cnx2a is null then 2
+        when cnx1 is not null and cnx1a is not null and cnx2 is not null and cnx2a is not null then 3
+    end as legs_total
+  , source_load_timestamp
+from keyed_itineraries